@@ -31,4 +31,92 @@ CREATE TABLE Vaccines (
     Name varchar(255),
     Doses int,
     PRIMARY KEY (Name)
-);
\ No newline at end of file
+);
+
+-- Recurring availability: one row covers every matching day from StartDate to EndDate.
+-- Recurrence is 'daily', 'weekdays' or 'weekly' (same weekday as StartDate).
+CREATE TABLE AvailabilityIntervals (
+    i_id INT IDENTITY(1, 1),
+    Username varchar(255) REFERENCES Caregivers,
+    StartDate date,
+    EndDate date,
+    Recurrence varchar(16),
+    Capacity int,
+    PRIMARY KEY (i_id)
+);
+
+CREATE INDEX IX_AvailabilityIntervals_Window ON AvailabilityIntervals (StartDate, EndDate);
+
+-- Days of an interval that have been booked; a day is full once Booked reaches the interval's Capacity
+CREATE TABLE AvailabilityExceptions (
+    i_id INT REFERENCES AvailabilityIntervals,
+    Day date,
+    Booked int,
+    PRIMARY KEY (i_id, Day)
+);
+
+CREATE INDEX IX_AvailabilityExceptions_Day ON AvailabilityExceptions (Day);
+
+-- Appointments older than the retention window are moved here by the archive command
+CREATE TABLE AppointmentsArchive (
+    a_id INT,
+    date Date,
+    p_username varchar(255),
+    c_username varchar(255),
+    vaccine_name varchar(255),
+    PRIMARY KEY (a_id)
+);
+
+CREATE INDEX IX_AppointmentsArchive_Patient ON AppointmentsArchive (p_username);
+CREATE INDEX IX_AppointmentsArchive_Caregiver ON AppointmentsArchive (c_username);
+
+-- Append-only journal of every change to reservations, availability and vaccine stock. Rows are written in the
+-- same transaction as the change they describe; consumers read it in seq order.
+CREATE TABLE ReservationEvents (
+    seq BIGINT IDENTITY(1, 1),
+    EventType varchar(32),
+    EventTime datetime2 DEFAULT SYSUTCDATETIME(),
+    Day date,
+    c_username varchar(255),
+    p_username varchar(255),
+    vaccine_name varchar(255),
+    a_id INT,
+    Quantity INT,
+    PRIMARY KEY (seq)
+);
+
+CREATE INDEX IX_ReservationEvents_EventType ON ReservationEvents (EventType, seq);
+
+-- Failed login counts and lockouts, shared by every scheduler process when SCHEDULER_THROTTLE_TABLE is set
+CREATE TABLE LoginThrottle (
+    ThrottleKey varchar(600),
+    Failures int,
+    LockedUntil datetime2,
+    LastFailure datetime2,
+    PRIMARY KEY (ThrottleKey)
+);
+
+CREATE INDEX IX_LoginThrottle_LastFailure ON LoginThrottle (LastFailure);
+
+-- Open slots per date (single-day availability plus unbooked interval capacity), updated in the same transaction as
+-- every upload, reservation and cancellation so calendar views never scan Availabilities
+CREATE TABLE AvailabilitySummary (
+    Day date,
+    OpenSlots int,
+    PRIMARY KEY (Day)
+);
+
+-- Short-lived reservation holds. A hold has already claimed its caregiver slot and one dose; confirm turns it into an
+-- appointment, and the reaper gives expired holds back to Availabilities and Vaccines
+CREATE TABLE Holds (
+    h_id INT IDENTITY(1, 1),
+    p_username varchar(255) REFERENCES Patients,
+    c_username varchar(255) REFERENCES Caregivers,
+    Day date,
+    vaccine_name varchar(255) REFERENCES Vaccines,
+    i_id INT,
+    ExpiresAt datetime2,
+    PRIMARY KEY (h_id)
+);
+
+CREATE INDEX IX_Holds_ExpiresAt ON Holds (ExpiresAt);
@@ -0,0 +1,94 @@
+-- Schema for a site database when sites are configured with SCHEDULER_SITES. Caregivers, Patients and
+-- LoginThrottle stay in the primary database (create.sql), so usernames are not foreign keys here.
+
+CREATE TABLE Vaccines (
+    Name varchar(255),
+    Doses int,
+    PRIMARY KEY (Name)
+);
+
+CREATE TABLE Appointments (
+    a_id INT,
+    date Date,
+    p_username varchar(255),
+    c_username varchar(255),
+    vaccine_name varchar(255) REFERENCES Vaccines,
+    PRIMARY KEY (a_id)
+);
+
+CREATE TABLE Availabilities (
+    Time date,
+    Username varchar(255),
+    PRIMARY KEY (Time, Username)
+);
+
+CREATE TABLE AvailabilityIntervals (
+    i_id INT IDENTITY(1, 1),
+    Username varchar(255),
+    StartDate date,
+    EndDate date,
+    Recurrence varchar(16),
+    Capacity int,
+    PRIMARY KEY (i_id)
+);
+
+CREATE INDEX IX_AvailabilityIntervals_Window ON AvailabilityIntervals (StartDate, EndDate);
+
+CREATE TABLE AvailabilityExceptions (
+    i_id INT REFERENCES AvailabilityIntervals,
+    Day date,
+    Booked int,
+    PRIMARY KEY (i_id, Day)
+);
+
+CREATE INDEX IX_AvailabilityExceptions_Day ON AvailabilityExceptions (Day);
+
+CREATE TABLE AppointmentsArchive (
+    a_id INT,
+    date Date,
+    p_username varchar(255),
+    c_username varchar(255),
+    vaccine_name varchar(255),
+    PRIMARY KEY (a_id)
+);
+
+CREATE INDEX IX_AppointmentsArchive_Patient ON AppointmentsArchive (p_username);
+CREATE INDEX IX_AppointmentsArchive_Caregiver ON AppointmentsArchive (c_username);
+
+CREATE TABLE ReservationEvents (
+    seq BIGINT IDENTITY(1, 1),
+    EventType varchar(32),
+    EventTime datetime2 DEFAULT SYSUTCDATETIME(),
+    Day date,
+    c_username varchar(255),
+    p_username varchar(255),
+    vaccine_name varchar(255),
+    a_id INT,
+    Quantity INT,
+    PRIMARY KEY (seq)
+);
+
+CREATE INDEX IX_ReservationEvents_EventType ON ReservationEvents (EventType, seq);
+
+-- Open slots per date (single-day availability plus unbooked interval capacity), updated in the same transaction as
+-- every upload, reservation and cancellation so calendar views never scan Availabilities
+CREATE TABLE AvailabilitySummary (
+    Day date,
+    OpenSlots int,
+    PRIMARY KEY (Day)
+);
+
+-- Short-lived reservation holds. A hold has already claimed its caregiver slot and one dose; confirm turns it into an
+-- appointment, and the reaper gives expired holds back to Availabilities and Vaccines
+CREATE TABLE Holds (
+    h_id INT IDENTITY(1, 1),
+    p_username varchar(255),
+    c_username varchar(255),
+    Day date,
+    vaccine_name varchar(255) REFERENCES Vaccines,
+    i_id INT,
+    ExpiresAt datetime2,
+    PRIMARY KEY (h_id)
+);
+
+CREATE INDEX IX_Holds_ExpiresAt ON Holds (ExpiresAt);
@@ -1,11 +1,31 @@
 import datetime
+import heapq
+import os
 import pymssql
 import re
+import socket
+import sys
+from db.Archiver import Archiver
+from db.AvailabilitySummary import AvailabilitySummary
+from db.ConflictError import ConflictError
 from db.ConnectionManager import ConnectionManager
+from db.HoldReaper import HoldReaper
+from db.Journal import Journal
+from db.ShardRouter import ShardRouter
+from db.Snapshot import Snapshot
+from db.UnitOfWork import UnitOfWork
+from db.UsernameFilter import UsernameFilter
+from db import Queries
+from model.AvailabilityInterval import AvailabilityInterval
 from model.Caregiver import Caregiver
+from model.Hold import Hold
 from model.Patient import Patient
 from model.Vaccine import Vaccine
+from report.Reports import Reports
 from util.Util import Util
+from util.LoginThrottle import LoginThrottle
+from util.Profiler import Profiler
+from util.Renderer import Renderer
 
 '''
 objects to keep track of the currently logged-in user
@@ -15,39 +35,39 @@ Note: it is always true that at most one of currentCaregiver and currentPatient
 current_patient = None
 current_caregiver = None
 
+# Failed logins are throttled per username and client before any password hashing is done
+login_throttle = LoginThrottle(persist=bool(os.getenv("SCHEDULER_THROTTLE_TABLE")))
+client_id = os.getenv("SCHEDULER_CLIENT") or socket.gethostname()
 
-def create_patient(tokens):  # Similar to create_caregiver code, except no external methods for username checking
+# Bloom filters of existing usernames, rebuilt at startup, so new usernames skip the existence pre-check
+username_filter = UsernameFilter()
+
+# Gives expired reservation holds back to availability and vaccine stock while the scheduler is online
+hold_reaper = HoldReaper()
+
+# Read-only snapshot used instead of the database in offline mode (None when online)
+snapshot = None
+OFFLINE_OPERATIONS = ("search_caregiver_schedule", "show_all_available_dates", "get_vaccine_information", "online",
+                      "set_format", "profile", "help", "quit")
+
+# Profiles every command when set (SCHEDULER_PROFILE=<directory> or "profile on"); None when profiling is off
+profiler = Profiler(os.getenv("SCHEDULER_PROFILE")) if os.getenv("SCHEDULER_PROFILE") else None
+PROFILE_DIRECTORY = "profiles"
+RESERVE_NEXT_HORIZON_DAYS = 365  # how far ahead reserve_next looks for recurring interval slots
+
+
+def create_patient(tokens):  # Similar to create_caregiver code
     if len(tokens) != 3:
         print("Failed to create user; try again")
         return
 
     username = tokens[1]
     password = tokens[2]
-
-    cm = ConnectionManager()
-    conn = cm.create_connection()
-
-    select_username = "SELECT Username FROM Patients WHERE Username = %s"
-    try:
-        cursor = conn.cursor(as_dict=True)
-        cursor.execute(select_username, username.lower())
-        #  returns false if the cursor is not before the first record or if there are no rows in the ResultSet.
-        for row in cursor:
-            if row["Username"] is not None:
-                print("Username already taken! Try again.")
-                cm.close_connection()
-                return
-    except pymssql.Error as e:
-        print("Error occurred when checking username availability; try again")
-        print("Db-Error:", e)
-        return
-    except Exception as e:
-        print("Error occurred when checking username; try again")
-        print("Error:", e)
+    # Only ask the database when the username filter says the name may already be taken
+    if username_filter.might_exist("patient", username) and username_exists_patient(username.lower()):
+        print("Username already taken! Try again.")
         return
 
-    cm.close_connection()
-
     if not check_password(password):  # Password must be valid to continue
         return
 
@@ -57,6 +77,9 @@ def create_patient(tokens):  # Similar to create_caregiver code, except no exter
 
     try:
         patient.save_to_db()
+    except pymssql.IntegrityError:  # the primary key has the final say on duplicates
+        print("Username already taken! Try again.")
+        return
     except pymssql.Error as e:
         print("Failed to register user; try again")
         print("Db-Error:", e)
@@ -65,6 +88,7 @@ def create_patient(tokens):  # Similar to create_caregiver code, except no exter
         print("Failed to create user; try again")
         print("Error:", e)
         return
+    username_filter.add("patient", username)
     print("Created user", username)
 
 
@@ -77,8 +101,8 @@ def create_caregiver(tokens):
 
     username = tokens[1]
     password = tokens[2]
-    # check 2: check if the username has been taken already
-    if username_exists_caregiver(username.lower()):
+    # check 2: check if the username has been taken already (skipped when the username filter has never seen it)
+    if username_filter.might_exist("caregiver", username) and username_exists_caregiver(username.lower()):
         print("Username taken, try again!")
         return
 
@@ -88,12 +112,15 @@ def create_caregiver(tokens):
     salt = Util.generate_salt()
     hash = Util.generate_hash(password, salt)
 
-    # create the caregiver
-    caregiver = Caregiver(username, salt=salt, hash=hash)
+    # create the caregiver (usernames are stored in lower case, which is how login looks them up)
+    caregiver = Caregiver(username.lower(), salt=salt, hash=hash)
 
     # save to caregiver information to our database
     try:
         caregiver.save_to_db()
+    except pymssql.IntegrityError:  # the primary key has the final say on duplicates
+        print("Username taken, try again!")
+        return
     except pymssql.Error as e:
         print("Failed to register user; try again")
         print("Db-Error:", e)
@@ -102,17 +129,39 @@ def create_caregiver(tokens):
         print("Failed to create user; try again")
         print("Error:", e)
         return
+    username_filter.add("caregiver", username)
     print("Created user", username)
 
 
+def username_exists_patient(username):
+    cm = ConnectionManager(primary=True)
+    conn = cm.create_connection()
+
+    try:
+        cursor = conn.cursor(as_dict=True)
+        Queries.execute(cursor, "patient.username_exists", username)
+        for row in cursor:
+            return row['Username'] is not None
+    except pymssql.Error as e:
+        print("Error occurred when checking username availability; try again")
+        print("Db-Error:", e)
+        return
+    except Exception as e:
+        print("Error occurred when checking username; try again")
+        print("Error:", e)
+        return
+    finally:
+        cm.close_connection()
+    return False
+
+
 def username_exists_caregiver(username):
-    cm = ConnectionManager()
+    cm = ConnectionManager(primary=True)
     conn = cm.create_connection()
 
-    select_username = "SELECT * FROM Caregivers WHERE Username = %s"
     try:
         cursor = conn.cursor(as_dict=True)
-        cursor.execute(select_username, username)
+        Queries.execute(cursor, "caregiver.username_exists", username)
         #  returns false if the cursor is not before the first record or if there are no rows in the ResultSet.
         for row in cursor:
             return row['Username'] is not None
@@ -160,7 +209,15 @@ def login_patient(tokens):  # Similar to login_caregiver code
 
     patient = None
     try:
+        wait = login_throttle.check("patient", username.lower(), client_id)
+        if wait > 0:
+            print("Too many login attempts; try again in {} seconds".format(wait))
+            return
         patient = Patient(username.lower(), password=password).get()
+        if patient is None:
+            login_throttle.record_failure("patient", username.lower(), client_id)
+        else:
+            login_throttle.record_success("patient", username.lower(), client_id)
     except pymssql.Error as e:
         print("Failed to retrieve login info; try again")
         print("Db-Error:", e)
@@ -195,7 +252,16 @@ def login_caregiver(tokens):
 
     caregiver = None
     try:
+        # check 3: refuse the attempt before hashing if this username / client has been failing too often
+        wait = login_throttle.check("caregiver", username.lower(), client_id)
+        if wait > 0:
+            print("Too many login attempts; try again in {} seconds".format(wait))
+            return
         caregiver = Caregiver(username.lower(), password=password).get()
+        if caregiver is None:
+            login_throttle.record_failure("caregiver", username.lower(), client_id)
+        else:
+            login_throttle.record_success("caregiver", username.lower(), client_id)
     except pymssql.Error as e:
         print("Failed to retrieve login information; try again")
         print("Db-Error:", e)
@@ -215,6 +281,9 @@ def login_caregiver(tokens):
 
 
 def search_caregiver_schedule(tokens):
+    if snapshot is not None:  # offline mode has no logins; the snapshot only holds public schedule data
+        search_caregiver_schedule_offline(tokens)
+        return
     if current_patient == current_caregiver:
         print("Please login before executing this task!")
         return
@@ -233,33 +302,22 @@ def search_caregiver_schedule(tokens):
         year = int(date_whole[2])
         d = datetime.datetime(year, month, day)
 
-        get_available_dates = "SELECT Time, Username FROM Availabilities WHERE Time = %s ORDER BY Username"
-        get_vaccines = "SELECT Name, Doses FROM Vaccines"
-
-        # Query all the rows of both availabilities and vaccines
-        cursor.execute(get_available_dates, d)
-        schedule_rows = cursor.fetchall()
-        cursor.execute(get_vaccines)
+        # Query all the rows of both availabilities (single days and recurring intervals) and vaccines
+        interval_slots = AvailabilityInterval.open_slots(conn, d.date(), d.date())
+        caregivers = set(slot[1] for slot in interval_slots)
+        Queries.execute(cursor, "availability.by_date", d)
+        caregivers.update(row["Username"] for row in cursor)
+        Queries.execute(cursor, "vaccine.all")
         vaccine_rows = cursor.fetchall()
 
-        if len(schedule_rows) == 0:  # No appointments avaiable this day
+        if len(caregivers) == 0:  # No appointments avaiable this day
             print("There are no appointments available on", tokens[1])
             return
 
-        print("-" * (len(vaccine_rows) * 20))
-        # This block of code outputs the column headers; the for-loop prints each vaccine name
-        print("{}\t".format("Caregiver"), end="")
-        for i in range(0, len(vaccine_rows)):
-            print("{: >10}\t".format(vaccine_rows[i]["Name"]), end="")
-        print("\n", end="")
-
-        print("-" * (len(vaccine_rows) * 20))
-        # Now print out each caregiver followed by the dose number of each vaccine
-        for row in schedule_rows:
-            print("{}\t".format(row['Username']), end="")
-            for i in range(0, len(vaccine_rows)):
-                print("{: >10}\t".format(vaccine_rows[i]["Doses"]), end="")
-            print("")
+        # One column per vaccine name; each caregiver row is followed by the dose number of each vaccine
+        columns = ["Caregiver"] + [vaccine["Name"] for vaccine in vaccine_rows]
+        doses = [vaccine["Doses"] for vaccine in vaccine_rows]
+        Renderer.render(columns, ([caregiver] + doses for caregiver in sorted(caregivers)))
 
     except pymssql.Error:
         print("Retrieving dates failed; try again")
@@ -274,6 +332,25 @@ def search_caregiver_schedule(tokens):
         cm.close_connection()
 
 
+def search_caregiver_schedule_offline(tokens):
+    if len(tokens) != 2:
+        print("Please input the right arguments.")
+        return
+    try:
+        day = parse_date(tokens[1])
+    except ValueError:
+        print("Please enter a valid date")
+        return
+    caregivers = snapshot.caregivers_on(day)
+    if len(caregivers) == 0:
+        print("There are no appointments available on", tokens[1])
+        return
+    vaccines = snapshot.vaccines()
+    columns = ["Caregiver"] + [name for name, _ in vaccines]
+    doses = [count for _, count in vaccines]
+    Renderer.render(columns, ([caregiver] + doses for caregiver in caregivers))
+
+
 def reserve(tokens):
     # First: check valid arguments / login requirements
     if current_patient == current_caregiver:
@@ -285,9 +362,9 @@ def reserve(tokens):
     if len(tokens) != 3:
         print("Failed to reserve appointment; wrong arguments")
         return
-    cm = ConnectionManager()
-    conn = cm.create_connection()
-    cursor = conn.cursor(as_dict=True)
+    # Everything below runs in one unit of work: one connection, one transaction
+    uow = UnitOfWork()
+    conn = uow.begin()
     try:
         # Second: Parse the date and attempt to retrieve date, caregiver, and vaccine name from the database
         date_whole = tokens[1].split("-")
@@ -295,63 +372,31 @@ def reserve(tokens):
         day = int(date_whole[1])
         year = int(date_whole[2])
         d = datetime.datetime(year, month, day)
-        find_available_dates = "SELECT TOP 1 Time, Username FROM Availabilities WHERE Time = %s ORDER BY Username"
-        cursor.execute(find_available_dates, d)
-        dates = cursor.fetchall()
-        if len(dates) == 0:
+        slot = first_slot_on(conn, d.date())
+        if slot is None:
             print("There are no caregivers available for this date")
             return
-        assigned_caregiver = dates[0]["Username"]
-        assigned_date = dates[0]["Time"]
         vaccine_name = tokens[2]
-        vaccine = Vaccine(vaccine_name, available_doses=None).get()
+        vaccine = uow.get_vaccine(vaccine_name)
 
         # Third: Check vaccine is valid and if it is remove 1 from the supply
         if vaccine is None:
             print("Our caregivers do not have this vaccine. Try again inputting a valid vaccine from this list:")
-            cursor.execute("SELECT Name FROM Vaccines")
-            for row in cursor:
-                print(row["Name"])
+            Renderer.render(["Name"], ([vaccine.vaccine_name] for vaccine in uow.load_vaccines()))
             return
         if vaccine.available_doses == 0:
             print("There are not enough doses left. Try another vaccine brand.")
             return
-        vaccine.decrease_available_doses(1)
-
-        # 4th: Add appointment to appointment database. ID is just 1 + the highest id number
-        add_appointment = "INSERT INTO Appointments VALUES (%d, %s, %s, %s, %s)"
-        temp_cursor = conn.cursor()
-        temp_cursor.execute("SELECT MAX(a_id) FROM Appointments")
-        highest_row = temp_cursor.fetchone()[0]
-        if highest_row is None:
-            cursor.execute(add_appointment, (1
-                                             , assigned_date, current_patient.username, assigned_caregiver,
-                                             vaccine_name))
-        else:
-            cursor.execute(add_appointment, (highest_row + 1
-                                             , assigned_date, current_patient.username, assigned_caregiver,
-                                             vaccine_name))
-
-        # 5th: Drop that caregiver's availability from the availability database
-        drop_availability = "DELETE FROM Availabilities WHERE Time = %s AND Username = %s"
-        cursor.execute(drop_availability, (d, assigned_caregiver))
-
-        conn.commit()
-
-        # 6th: Output information about the appointment if successfully added
-        print("Success! Below is information on your appointment:")
-        print("-----------------------")
-        get_appointment = "SELECT a_id, date, c_username, vaccine_name FROM appointments WHERE p_username = %s AND c_username = %s AND date = %s"
-        cursor.execute(get_appointment, (current_patient.username, assigned_caregiver, assigned_date))
-        print("{: >10}\t{: >10}\t{: >10}\t{: >10}".format("Appointment ID", "Date", "Caregiver", "Vaccine"))
-        for row in cursor:
-            print("{: >10}\t{: >10}\t{: >10}\t{: >10}".format(row["a_id"], str(row["date"]), row["c_username"],
-                                                              row["vaccine_name"]))
+        book_appointment(uow, slot[0], slot[1], vaccine, slot[2])
 
     except pymssql.Error as e:
         print("Error trying to create appointment; try again")
         print("DBError:", e)
         return
+    except ConflictError as e:
+        print("Another reservation just took that slot or the last dose; try again")
+        print("Error:", e)
+        return
     except ValueError as e:
         print("Invalid date format; try again")
         print("Error:", e)
@@ -361,7 +406,218 @@ def reserve(tokens):
         print("Error:", e)
         return
     finally:
-        cm.close_connection()
+        uow.close()
+
+
+def reserve_next(tokens):
+    #  reserve_next <date> <vaccine> [window_days]: book the earliest open slot on or after the date
+    if current_patient is None:
+        print("Please login as a patient to reserve an appointment")
+        return
+    if len(tokens) not in (3, 4):
+        print("Failed to reserve appointment; wrong arguments")
+        return
+    uow = UnitOfWork()
+    conn = uow.begin()
+    cursor = conn.cursor(as_dict=True)
+    try:
+        start_date = parse_date(tokens[1])
+        vaccine_name = tokens[2]
+        end_date = datetime.date.max
+        if len(tokens) == 4:
+            window_days = int(tokens[3])
+            if window_days < 0:
+                raise ValueError("Window cannot be negative")
+            end_date = start_date + datetime.timedelta(days=window_days)
+
+        vaccine = uow.get_vaccine(vaccine_name)
+        if vaccine is None:
+            print("Our caregivers do not have this vaccine. Try again inputting a valid vaccine from this list:")
+            Renderer.render(["Name"], ([vaccine.vaccine_name] for vaccine in uow.load_vaccines()))
+            return
+        if vaccine.available_doses == 0:
+            print("There are not enough doses left. Try another vaccine brand.")
+            return
+
+        # One seek on the (Time, Username) primary key, joined to Vaccines so a vaccine without stock finds nothing
+        Queries.execute(cursor, "availability.first_on_or_after", (vaccine_name, start_date, end_date))
+        row = cursor.fetchone()
+        slot = None if row is None else (row["Time"], row["Username"], None)
+
+        # Recurring intervals only need expanding up to the single-day slot already found, and otherwise at most
+        # RESERVE_NEXT_HORIZON_DAYS ahead, so the work stays bounded however far the intervals reach
+        if slot is not None:
+            interval_end = slot[0]
+        else:
+            interval_end = min(end_date, start_date + datetime.timedelta(days=RESERVE_NEXT_HORIZON_DAYS))
+        interval_slot = AvailabilityInterval.first_open_slot(conn, start_date, interval_end)
+        if interval_slot is not None and (slot is None or interval_slot[:2] < slot[:2]):
+            slot = interval_slot[:3]
+
+        if slot is None:
+            print("There are no caregivers available on or after", tokens[1])
+            return
+        book_appointment(uow, slot[0], slot[1], vaccine, slot[2])
+    except pymssql.Error as e:
+        print("Error trying to create appointment; try again")
+        print("DBError:", e)
+    except ConflictError as e:
+        print("Another reservation just took that slot or the last dose; try again")
+        print("Error:", e)
+    except ValueError as e:
+        print("Invalid date or window; try again")
+        print("Error:", e)
+    except Exception as e:
+        print("Error occurred when creating an appointment; try again")
+        print("Error:", e)
+    finally:
+        uow.close()
+
+
+# The (date, caregiver, i_id) of the first caregiver alphabetically with an open slot on the day, whether the slot
+# is a single day (i_id None) or part of an interval; None if nobody is available
+def first_slot_on(conn, day):
+    cursor = conn.cursor()
+    interval_slot = next(AvailabilityInterval.open_slots(conn, day, day), None)
+    Queries.execute(cursor, "availability.first_by_date", day)
+    row = cursor.fetchone()
+    if row is None and interval_slot is None:
+        return None
+    if row is None or (interval_slot is not None and interval_slot[1] < row[1]):
+        return interval_slot[:3]
+    return row[0], row[1], None
+
+
+# Take one dose of the vaccine and the caregiver's slot on the given date inside the unit of work. i_id is the
+# availability interval the slot comes from, or None for a single-day availability.
+def claim_slot(uow, assigned_date, assigned_caregiver, vaccine, i_id=None):
+    conn = uow.conn
+    uow.change_doses(vaccine, -1)
+
+    # Drop that caregiver's availability from the availability database (or book one interval slot)
+    if i_id is None:
+        cursor = conn.cursor()
+        Queries.execute(cursor, "availability.delete", (assigned_date, assigned_caregiver))
+        if cursor.rowcount == 0:  # another reservation or hold claimed the same slot after we picked it
+            raise ConflictError("That caregiver is no longer available on this date")
+        Journal.record(conn, Journal.AVAILABILITY_CLAIMED, day=assigned_date, c_username=assigned_caregiver)
+        AvailabilitySummary.adjust(conn, assigned_date, -1)
+    else:
+        AvailabilityInterval.book(conn, i_id, assigned_caregiver, assigned_date)
+
+
+# Add appointment to appointment database and return its id. ID is just 1 + the highest id number
+def insert_appointment(conn, assigned_date, assigned_caregiver, vaccine_name):
+    temp_cursor = conn.cursor()
+    Queries.execute(temp_cursor, "appointment.max_id")
+    highest_row = temp_cursor.fetchone()[0]
+    a_id = 1 if highest_row is None else highest_row + 1
+    Queries.execute(temp_cursor, "appointment.insert", (a_id, assigned_date, current_patient.username,
+                                                        assigned_caregiver, vaccine_name))
+    Journal.record(conn, Journal.RESERVATION_CREATED, day=assigned_date, c_username=assigned_caregiver,
+                   p_username=current_patient.username, vaccine_name=vaccine_name, a_id=a_id)
+    return a_id
+
+
+# Book one dose of the vaccine with the caregiver on the given date and commit the unit of work
+def book_appointment(uow, assigned_date, assigned_caregiver, vaccine, i_id=None):
+    # Every change below (and its journal event) is committed together
+    claim_slot(uow, assigned_date, assigned_caregiver, vaccine, i_id)
+    insert_appointment(uow.conn, assigned_date, assigned_caregiver, vaccine.vaccine_name)
+    uow.commit()
+    print_booked_appointment(uow.conn, assigned_date, assigned_caregiver)
+
+
+def print_booked_appointment(conn, assigned_date, assigned_caregiver):
+    cursor = conn.cursor(as_dict=True)
+    # Output information about the appointment if successfully added
+    print("Success! Below is information on your appointment:")
+    Queries.execute(cursor, "appointment.get_booked", (current_patient.username, assigned_caregiver, assigned_date))
+    Renderer.render(["Appointment ID", "Date", "Caregiver", "Vaccine"],
+                    ((row["a_id"], row["date"], row["c_username"], row["vaccine_name"]) for row in cursor))
+
+
+def hold(tokens):
+    #  hold <date> <vaccine>: claim a slot and a dose for a few minutes; confirm <hold_id> books it
+    if current_patient is None:
+        print("Please login as a patient to hold an appointment")
+        return
+    if len(tokens) != 3:
+        print("Failed to hold appointment; wrong arguments")
+        return
+    uow = UnitOfWork()
+    conn = uow.begin()
+    try:
+        day = parse_date(tokens[1])
+        slot = first_slot_on(conn, day)
+        if slot is None:
+            print("There are no caregivers available for this date")
+            return
+        vaccine = uow.get_vaccine(tokens[2])
+        if vaccine is None:
+            print("Our caregivers do not have this vaccine. Try again inputting a valid vaccine from this list:")
+            Renderer.render(["Name"], ([vaccine.vaccine_name] for vaccine in uow.load_vaccines()))
+            return
+        if vaccine.available_doses == 0:
+            print("There are not enough doses left. Try another vaccine brand.")
+            return
+        claim_slot(uow, slot[0], slot[1], vaccine, slot[2])
+        held = Hold(current_patient.username, slot[1], slot[0], vaccine.vaccine_name, i_id=slot[2]).save_to_db(conn)
+        uow.commit()
+    except pymssql.Error as e:
+        print("Error trying to hold appointment; try again")
+        print("DBError:", e)
+        return
+    except ConflictError as e:
+        print("Another reservation just took that slot or the last dose; try again")
+        print("Error:", e)
+        return
+    except ValueError as e:
+        print("Invalid date format; try again")
+        print("Error:", e)
+        return
+    except Exception as e:
+        print("Error occurred when holding an appointment; try again")
+        print("Error:", e)
+        return
+    finally:
+        uow.close()
+    print("Held! Confirm with: confirm", held.h_id)
+    Renderer.render(["Hold ID", "Date", "Caregiver", "Vaccine", "Expires (UTC)"],
+                    [(held.h_id, held.day, held.c_username, held.vaccine_name, held.expires_at)])
+
+
+def confirm(tokens):
+    #  confirm <hold_id>: turn an unexpired hold into an appointment
+    if current_patient is None:
+        print("Please login as a patient to confirm an appointment")
+        return
+    if len(tokens) != 2:
+        print("Failed to confirm appointment; wrong arguments")
+        return
+    uow = UnitOfWork()
+    conn = uow.begin()
+    try:
+        held = Hold.take(conn, int(tokens[1]), current_patient.username)
+        if held is None:
+            print("Could not find an active hold with id:", tokens[1])
+            return
+        # The slot and the dose were claimed by the hold; only the appointment itself is added
+        a_id = insert_appointment(conn, held.day, held.c_username, held.vaccine_name)
+        Journal.record(conn, Journal.HOLD_CONFIRMED, day=held.day, c_username=held.c_username,
+                       p_username=held.p_username, vaccine_name=held.vaccine_name, a_id=a_id, quantity=1)
+        uow.commit()
+        print_booked_appointment(conn, held.day, held.c_username)
+    except pymssql.Error as e:
+        print("Error trying to confirm appointment; try again")
+        print("DBError:", e)
+    except ValueError:
+        print("Could not find an active hold with id:", tokens[1])
+    except Exception as e:
+        print("Error occurred when confirming an appointment; try again")
+        print("Error:", e)
+    finally:
+        uow.close()
 
 
 def upload_availability(tokens):
@@ -400,22 +656,65 @@ def upload_availability(tokens):
     print("Availability uploaded!")
 
 
+def upload_availability_range(tokens):
+    #  upload_availability_range <start_date> <end_date> <daily|weekdays|weekly> [capacity]
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) not in (4, 5):
+        print("Please try again!")
+        return
+    try:
+        start_date = parse_date(tokens[1])
+        end_date = parse_date(tokens[2])
+        capacity = int(tokens[4]) if len(tokens) == 5 else 1
+        interval = AvailabilityInterval(current_caregiver.username, start_date, end_date, tokens[3].lower(), capacity)
+        interval.save_to_db()
+    except pymssql.Error as e:
+        print("Upload Availability Failed; try again")
+        print("Db-Error:", e)
+        return
+    except ValueError as e:
+        print("Please enter valid dates, recurrence and capacity!")
+        print("Error:", e)
+        return
+    except Exception as e:
+        print("Error occurred when uploading availability; try again")
+        print("Error:", e)
+        return
+    print("Availability uploaded!")
+
+
+def parse_date(text):
+    # dates are hyphenated in the format mm-dd-yyyy
+    date_tokens = text.split("-")
+    if len(date_tokens) != 3:
+        raise ValueError("Date must be in the format mm-dd-yyyy")
+    return datetime.date(int(date_tokens[2]), int(date_tokens[0]), int(date_tokens[1]))
+
+
 def cancel(tokens):  # Extra credit cancel option implementation
     if current_patient == current_caregiver:
         print("Please login first!")
         return
-    if len(tokens) != 2:
+    # cancel <appointment_id> [site]; the site defaults to the active one (see show_appointments)
+    if len(tokens) not in (2, 3):
         print("Failed to cancel appointment; wrong arguments given")
         return
+    cancel_id = tokens[1]
+    site = None
+    if len(tokens) == 3:
+        site = tokens[2].lower()
+        if site not in ShardRouter.sites():
+            print("Unknown site:", tokens[2])
+            return
+    uow = UnitOfWork(site=site)
     try:
-        cm = ConnectionManager()
-        conn = cm.create_connection()
+        conn = uow.begin()
         cursor = conn.cursor(as_dict=True)
-        cancel_id = tokens[1]
 
         # Check 1: check that the user's desired appointment id is actually in their own appointments
-        get_appointment = "SELECT a_id, date, p_username, c_username, vaccine_name FROM Appointments WHERE a_id = %d"
-        cursor.execute(get_appointment, cancel_id)
+        Queries.execute(cursor, "appointment.get", int(cancel_id))
         appointment = cursor.fetchone()
         valid_appointment = False
         if current_patient is not None:
@@ -430,18 +729,23 @@ def cancel(tokens):  # Extra credit cancel option implementation
                 print("Could not find appointment with id:", cancel_id)
 
         # If valid appointment id, then delete that appointment while replenishing the respective vaccine supply (+1)
+        # All of it (and the journal events) is committed in one transaction
         if valid_appointment:
-            delete_appointment = "DELETE FROM Appointments WHERE a_id = %d"
-            vaccine = Vaccine(appointment["vaccine_name"], None).get()
-            vaccine.increase_available_doses(1)  # Need this to replenish 1 more vaccine if cancel is successful
-            cursor.execute(delete_appointment, cancel_id)
-            conn.commit()
-            print("Appointment successfully cancelled.")
+            appointment_date = appointment['date']
+            caregiver = appointment['c_username']
+            vaccine = uow.get_vaccine(appointment["vaccine_name"])
+            uow.change_doses(vaccine, 1)  # Need this to replenish 1 more vaccine if cancel is successful
+            Queries.execute(cursor, "appointment.delete", int(cancel_id))
+            Journal.record(conn, Journal.RESERVATION_CANCELLED, day=appointment_date, c_username=caregiver,
+                           p_username=appointment['p_username'], vaccine_name=appointment["vaccine_name"],
+                           a_id=appointment['a_id'])
             if current_patient is not None:  # If a patient canceled that appointment, add the availability back to caregiver
-                appointment_date = appointment['date']
-                caregiver = appointment['c_username']
-                cursor.execute("INSERT INTO Availabilities VALUES (%d, %d)", (appointment_date, caregiver))
-                conn.commit()
+                if not AvailabilityInterval.release(conn, caregiver, appointment_date):
+                    Queries.execute(cursor, "availability.insert", (appointment_date, caregiver))
+                    Journal.record(conn, Journal.AVAILABILITY_ADDED, day=appointment_date, c_username=caregiver)
+                    AvailabilitySummary.adjust(conn, appointment_date, 1)
+            uow.commit()
+            print("Appointment successfully cancelled.")
         else:
             print("Could not find appointment with id:", cancel_id)
     except pymssql.Error as e:
@@ -450,28 +754,35 @@ def cancel(tokens):  # Extra credit cancel option implementation
     except Exception as e:
         print("Could not find appointment with id:", cancel_id)
     finally:
-        cm.close_connection()
+        uow.close()
 
 
 def show_all_available_dates(tokens):
     if len(tokens) != 1:
         print("Failed to show available dates")
         return
+    if snapshot is not None:
+        if Renderer.stream(["Date", "Caregiver"], snapshot.available_dates()) == 0:
+            print("There are no dates available for vaccine appointments!")
+        return
+    if ShardRouter.is_sharded():
+        show_available_dates_all_sites()
+        return
     cm = ConnectionManager()
     conn = cm.create_connection()
     cursor = conn.cursor(as_dict=True)
     try:
-        cursor.execute("SELECT Time, Username FROM Availabilities")
-        availabilities = cursor.fetchall()
-        if len(availabilities) == 0:
+        # Rows are streamed from the cursor so large schedules are never held in memory all at once. Recurring
+        # intervals are expanded day by day from today and merged in date order.
+        today = datetime.date.today()
+        last_day = AvailabilityInterval.last_end_date(conn) or today
+        interval_slots = ((slot[0], slot[1]) for slot in AvailabilityInterval.open_slots(conn, today, last_day))
+        Queries.execute(cursor, "availability.all")
+        single_days = ((row["Time"], row["Username"]) for row in cursor)
+        count = Renderer.stream(["Date", "Caregiver"], heapq.merge(single_days, interval_slots))
+        if count == 0:
             print("There are no dates available for vaccine appointments!")
             return
-        print("-" * (len(availabilities) * 20))
-        print("{: >10}\t{: >10}".format("Date", "Caregiver"))
-        print("-" * (len(availabilities) * 20))
-        for i in range(0, len(availabilities)):
-            print("{: >10}\t{: >10}"
-                  .format(str(availabilities[i]["Time"]), availabilities[i]["Username"]))
 
     except pymssql.Error as e:
         print("Error in retrieving appointments")
@@ -483,6 +794,85 @@ def show_all_available_dates(tokens):
         cm.close_connection()
 
 
+# Open dates of one site's database, sorted by date and caregiver
+def available_dates_on(conn):
+    today = datetime.date.today()
+    last_day = AvailabilityInterval.last_end_date(conn) or today
+    interval_slots = [(slot[0], slot[1]) for slot in AvailabilityInterval.open_slots(conn, today, last_day)]
+    cursor = conn.cursor()
+    Queries.execute(cursor, "availability.all")
+    return list(heapq.merge(cursor.fetchall(), interval_slots))
+
+
+def show_available_dates_all_sites():
+    # Every site's database is queried in parallel and the sorted results are merged by date
+    try:
+        results = ConnectionManager.scatter(available_dates_on)
+        per_site = [[(day, username, site) for day, username in rows] for site, rows in results]
+        if Renderer.stream(["Date", "Caregiver", "Site"], heapq.merge(*per_site)) == 0:
+            print("There are no dates available for vaccine appointments!")
+    except pymssql.Error as e:
+        print("Error in retrieving appointments")
+        print("DBError:", e)
+    except Exception as e:
+        print("Error in showing appointments")
+        print("Error:", e)
+
+
+def calendar(tokens):
+    #  calendar <start_date> <end_date> [vaccine]: open slots per date, read only from the availability summary
+    #  calendar rebuild: recount the summary from the availability tables (caregivers only)
+    if len(tokens) == 2 and tokens[1].lower() == "rebuild":
+        rebuild_calendar()
+        return
+    if len(tokens) not in (3, 4):
+        print("Failed to show the calendar; wrong arguments")
+        return
+    try:
+        start_date = parse_date(tokens[1])
+        end_date = parse_date(tokens[2])
+        vaccine_name = tokens[3] if len(tokens) == 4 else None
+        rows = AvailabilitySummary.calendar(start_date, end_date, vaccine_name)
+    except pymssql.Error as e:
+        print("Error in retrieving the calendar")
+        print("DBError:", e)
+        return
+    except ValueError as e:
+        print("Please enter valid dates!")
+        print("Error:", e)
+        return
+    except Exception as e:
+        print("Error in showing the calendar")
+        print("Error:", e)
+        return
+    if len(rows) == 0:
+        print("There are no dates available for vaccine appointments!")
+        return
+    Renderer.render(["Date", "Open Slots"] if vaccine_name is None else ["Date", "Open Slots", "Bookable"], rows)
+
+
+def rebuild_calendar():
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    try:
+        with ConnectionManager.transaction() as conn:
+            # Interval capacity is counted from today on; past days are not shown by the calendar anyway
+            today = datetime.date.today()
+            last_day = AvailabilityInterval.last_end_date(conn) or today
+            slots = ((slot[0], slot[3]) for slot in AvailabilityInterval.open_slots(conn, today, last_day))
+            AvailabilitySummary.rebuild(conn, slots)
+    except pymssql.Error as e:
+        print("Error in rebuilding the calendar")
+        print("DBError:", e)
+        return
+    except Exception as e:
+        print("Error in rebuilding the calendar")
+        print("Error:", e)
+        return
+    print("Calendar rebuilt")
+
+
 def add_doses(tokens):
     #  add_doses <vaccine> <number>
     #  check 1: check if the current logged-in user is a caregiver
@@ -497,10 +887,21 @@ def add_doses(tokens):
         return
 
     vaccine_name = tokens[1]
-    doses = int(tokens[2])
     vaccine = None
+    # if the vaccine is not found in the database, add a new (vaccine, doses) entry.
+    # else, update the existing entry by adding the new doses; either way in a single transaction
     try:
-        vaccine = Vaccine(vaccine_name, doses).get()
+        doses = int(tokens[2])
+        with UnitOfWork() as uow:
+            vaccine = uow.get_vaccine(vaccine_name)
+            if vaccine is None:
+                vaccine = Vaccine(vaccine_name, doses)
+                uow.add_vaccine(vaccine)
+            else:
+                if doses <= 0:
+                    raise ValueError("Argument cannot be negative!")
+                uow.change_doses(vaccine, doses)
+            uow.commit()
     except pymssql.Error as e:
         print("Error occurred when adding doses; try again")
         print("Db-Error:", e)
@@ -509,33 +910,6 @@ def add_doses(tokens):
         print("Error occurred when adding doses; try again")
         print("Error:", e)
         return
-
-    # if the vaccine is not found in the database, add a new (vaccine, doses) entry.
-    # else, update the existing entry by adding the new doses
-    if vaccine is None:
-        vaccine = Vaccine(vaccine_name, doses)
-        try:
-            vaccine.save_to_db()
-        except pymssql.Error as e:
-            print("Error occurred when adding doses; try again")
-            print("Db-Error:", e)
-            return
-        except Exception as e:
-            print("Error occurred when adding doses; try again")
-            print("Error:", e)
-            return
-    else:
-        # if the vaccine is not null, meaning that the vaccine already exists in our table
-        try:
-            vaccine.increase_available_doses(doses)
-        except pymssql.Error as e:
-            print("Error occurred when updating doses; try again")
-            print("Db-Error:", e)
-            return
-        except Exception as e:
-            print("Error occurred when adding doses; try again")
-            print("Error:", e)
-            return
     print("Updated {}: Number of doses now available: {}".format(vaccine.vaccine_name.lower(), vaccine.available_doses))
 
 
@@ -543,48 +917,32 @@ def show_appointments(tokens):
     if current_patient == current_caregiver:
         print("Please login first!")
         return
-    if len(tokens) != 1:
+    # show_appointments [all]; "all" also includes appointments that have been archived
+    if len(tokens) != 1 and (len(tokens) != 2 or tokens[1].lower() != "all"):
         print("Failed to show appointments")
         return
+    with_archive = len(tokens) == 2
+    if current_patient is not None:
+        # Appointments for the current logged in patient
+        query_id = "appointment.by_patient_with_archive" if with_archive else "appointment.by_patient"
+        username = current_patient.username
+        columns = ["Appointment ID", "Vaccine", "Date", "Caregiver"]
+    else:
+        # Appointments for the current logged in caregiver
+        query_id = "appointment.by_caregiver_with_archive" if with_archive else "appointment.by_caregiver"
+        username = current_caregiver.username
+        columns = ["Appointment ID", "Vaccine", "Date", "Patient"]
+    if ShardRouter.is_sharded():
+        show_appointments_all_sites(query_id, username, columns)
+        return
     cm = ConnectionManager()
     conn = cm.create_connection()
-    cursor = conn.cursor(as_dict=True)
+    cursor = conn.cursor()
     try:
-        if current_patient is not None:
-            # Attempt to get appointments for the current logged in patient and then print them
-            get_patient_appointments = "SELECT a_id, vaccine_name, date, c_username FROM Appointments WHERE " \
-                                       "p_username = %s ORDER BY a_id"
-            cursor.execute(get_patient_appointments, current_patient.username)
-            appointments = cursor.fetchall()
-            if len(appointments) == 0:
-                print("There are no appointments scheduled")
-                return
-            print("-" * (len(appointments) * 20))
-            print("{: >10}\t{: >10}\t{: >10}\t{: >10}\t".format("Appointment ID", "Vaccine", "Date", "Caregiver"),
-                  end="")
-            print("")
-
-            for i in range(0, len(appointments)):
-                print("{: >10}\t{: >10}\t{: >10}\t{: >10}\t"
-                      .format(appointments[i]["a_id"], appointments[i]["vaccine_name"], str(appointments[i]["date"]),
-                              appointments[i]["c_username"]))
-
-        elif current_caregiver is not None:
-            # Attempt to get the appointments for the current logged in caregiver.
-            get_caregiver_appointments = "SELECT a_id, vaccine_name, date, p_username FROM Appointments WHERE " \
-                                         "c_username = %s ORDER BY a_id"
-            cursor.execute(get_caregiver_appointments, current_caregiver.username)
-            appointments = cursor.fetchall()
-            if len(appointments) == 0:
-                print("There are no appointments scheduled")
-                return
-            print("-" * (len(appointments) * 20))
-            print("{: >10}\t{: >10}\t{: >10}\t{: >10}\t".format("Appointment ID", "Vaccine", "Date", "Patient"), end="")
-            print("")
-            for i in range(0, len(appointments)):
-                print("{: >10}\t{: >10}\t{: >10}\t{: >10}\t"
-                      .format(appointments[i]["a_id"], appointments[i]["vaccine_name"], str(appointments[i]["date"]),
-                              appointments[i]["p_username"]))
+        Queries.execute(cursor, query_id, username)
+        if Renderer.stream(columns, cursor) == 0:
+            print("There are no appointments scheduled")
+            return
 
     except pymssql.Error as e:
         print("Error in retrieving appointments")
@@ -596,6 +954,245 @@ def show_appointments(tokens):
         cm.close_connection()
 
 
+def show_appointments_all_sites(query_id, username, columns):
+    # Appointment ids are only unique within a site, so every row carries its site (cancel takes it as well)
+    try:
+        results = ConnectionManager.scatter(
+            lambda conn: Queries.execute(conn.cursor(), query_id, username).fetchall())
+        rows = [tuple(row) + (site,) for site, site_rows in results for row in site_rows]
+        if Renderer.stream(columns + ["Site"], rows) == 0:
+            print("There are no appointments scheduled")
+    except pymssql.Error as e:
+        print("Error in retrieving appointments")
+        print("DBError:", e)
+    except Exception as e:
+        print("Error in showing appointments")
+        print("Error:", e)
+
+
+def report(tokens):
+    #  report <daily_appointments|caregiver_utilization|dose_burndown> <file.csv>
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) != 3:
+        print("Failed to create report; wrong arguments")
+        return
+    try:
+        count = Reports.export(tokens[1], tokens[2])
+    except pymssql.Error as e:
+        print("Error occurred when creating report; try again")
+        print("Db-Error:", e)
+        return
+    except ValueError as e:
+        print("Please enter one of the reports: " + ", ".join(Reports.REPORTS))
+        return
+    except Exception as e:
+        print("Error occurred when creating report; try again")
+        print("Error:", e)
+        return
+    print("Wrote {} rows to {}".format(count, tokens[2]))
+
+
+def archive(tokens):
+    #  archive [retention_days] [batch_size]
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) > 3:
+        print("Failed to archive; wrong arguments")
+        return
+    try:
+        retention_days = int(tokens[1]) if len(tokens) > 1 else Archiver.RETENTION_DAYS
+        batch_size = int(tokens[2]) if len(tokens) > 2 else Archiver.BATCH_SIZE
+        counts = Archiver(retention_days, batch_size).run()
+    except pymssql.Error as e:
+        print("Error occurred when archiving; try again")
+        print("Db-Error:", e)
+        return
+    except ValueError as e:
+        print("Please enter a valid number of days and batch size")
+        print("Error:", e)
+        return
+    except Exception as e:
+        print("Error occurred when archiving; try again")
+        print("Error:", e)
+        return
+    for step, count in counts.items():
+        print("{}: {}".format(step.capitalize(), count))
+
+
+def show_events(tokens):
+    #  show_events [after_seq] [limit]
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) > 3:
+        print("Failed to show events; wrong arguments")
+        return
+    try:
+        after_seq = int(tokens[1]) if len(tokens) > 1 else 0
+        limit = int(tokens[2]) if len(tokens) > 2 else 100
+        events = Journal.tail(after_seq, limit)
+    except pymssql.Error as e:
+        print("Error in retrieving events")
+        print("DBError:", e)
+        return
+    except ValueError:
+        print("Please enter a valid sequence number and limit")
+        return
+    except Exception as e:
+        print("Error in showing events")
+        print("Error:", e)
+        return
+    if len(events) == 0:
+        print("There are no new events")
+        return
+    Renderer.render(["Seq", "Event", "Time", "Date", "Caregiver", "Patient", "Vaccine", "Appointment ID", "Quantity"],
+                    events)
+
+
+def replay_journal(tokens):
+    #  replay_journal [apply|checkpoint]; without an argument the rebuilt state is only shown
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) != 1 and (len(tokens) != 2 or tokens[1].lower() not in ("apply", "checkpoint")):
+        print("Failed to replay journal; wrong arguments")
+        return
+    try:
+        if len(tokens) == 2 and tokens[1].lower() == "checkpoint":
+            print("Journal checkpoint written at seq", Journal.checkpoint())
+            return
+        availabilities, doses, checkpoint_seq, through_seq = Journal.rebuild()
+        if checkpoint_seq is None:
+            print("Rebuilt state from every event up to seq", through_seq, "(no checkpoint)")
+        else:
+            print("Rebuilt state from the checkpoint at seq", checkpoint_seq, "up to seq", through_seq)
+        Renderer.render(["Vaccine Name", "Number of Doses Available"], sorted(doses.items()))
+        print("Available caregiver days:", len(availabilities))
+        if len(tokens) == 2:
+            Journal.apply(availabilities, doses, checkpoint_seq, through_seq)
+            print("Availabilities and vaccine doses were replaced with the rebuilt state.")
+    except pymssql.Error as e:
+        print("Error occurred when replaying the journal; try again")
+        print("Db-Error:", e)
+    except (ConflictError, ValueError) as e:
+        print("The rebuilt state was not applied")
+        print("Error:", e)
+    except Exception as e:
+        print("Error occurred when replaying the journal; try again")
+        print("Error:", e)
+
+
+def forecast_doses(tokens):
+    #  forecast_doses [trailing_days]
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) > 2:
+        print("Failed to forecast doses; wrong arguments")
+        return
+    try:
+        from report.Analytics import Analytics  # numpy is only needed for the analytics commands
+        trailing_days = int(tokens[1]) if len(tokens) == 2 else Analytics.TRAILING_DAYS
+        if trailing_days <= 0:
+            raise ValueError("Trailing days must be positive")
+        rows = Analytics().load().stock_out_forecast(trailing_days)
+    except ImportError:
+        print("The analytics commands need numpy; install it with: pip install numpy")
+        return
+    except pymssql.Error as e:
+        print("Error occurred when forecasting doses; try again")
+        print("Db-Error:", e)
+        return
+    except ValueError as e:
+        print("Please enter a valid number of days")
+        return
+    except Exception as e:
+        print("Error occurred when forecasting doses; try again")
+        print("Error:", e)
+        return
+    Renderer.render(["Vaccine", "Doses Left", "Doses Per Day", "Projected Stock-Out"], rows)
+
+
+def staffing_gaps(tokens):
+    #  staffing_gaps <start_date> <end_date> [trailing_days]
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) not in (3, 4):
+        print("Failed to compute staffing gaps; wrong arguments")
+        return
+    try:
+        from report.Analytics import Analytics
+        start_date = parse_date(tokens[1])
+        end_date = parse_date(tokens[2])
+        trailing_days = int(tokens[3]) if len(tokens) == 4 else Analytics.TRAILING_DAYS
+        if trailing_days <= 0:
+            raise ValueError("Trailing days must be positive")
+        rows = Analytics().load().staffing_gaps(start_date, end_date, trailing_days)
+    except ImportError:
+        print("The analytics commands need numpy; install it with: pip install numpy")
+        return
+    except pymssql.Error as e:
+        print("Error occurred when computing staffing gaps; try again")
+        print("Db-Error:", e)
+        return
+    except ValueError as e:
+        print("Please enter valid dates and number of days")
+        print("Error:", e)
+        return
+    except Exception as e:
+        print("Error occurred when computing staffing gaps; try again")
+        print("Error:", e)
+        return
+    Renderer.render(["Date", "Booked", "Open Slots", "Expected Demand", "Gap"], rows)
+
+
+def export_snapshot(tokens):
+    #  export_snapshot <file>
+    if current_caregiver is None:
+        print("Please login as a caregiver first!")
+        return
+    if len(tokens) != 2:
+        print("Failed to export snapshot; wrong arguments")
+        return
+    try:
+        counts = Snapshot.export(tokens[1])
+    except pymssql.Error as e:
+        print("Error occurred when exporting snapshot; try again")
+        print("Db-Error:", e)
+        return
+    except Exception as e:
+        print("Error occurred when exporting snapshot; try again")
+        print("Error:", e)
+        return
+    print("Wrote snapshot to {} ({})".format(tokens[1], ", ".join(
+        "{} {} rows".format(count, table) for table, count in counts.items())))
+
+
+def go_offline(path):
+    global snapshot
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError) as e:
+        print("Failed to open snapshot; try again")
+        print("Error:", e)
+        return
+    hold_reaper.stop()
+    print("Offline mode: reading from snapshot created", snapshot.created)
+
+
+def go_online():
+    global snapshot
+    if snapshot is not None:
+        snapshot.close()
+        snapshot = None
+    hold_reaper.start()
+    print("Online mode: reading from the database")
+
+
 def logout(tokens):
     global current_patient
     global current_caregiver
@@ -615,16 +1212,15 @@ def logout(tokens):
 
 
 def get_vaccine_doses():  # Just a helpful method for people to see the vaccine doses without having to look for appointment
+    if snapshot is not None:
+        Renderer.render(["Vaccine Name", "Number of Doses Available"], snapshot.vaccines())
+        return
     try:
         cm = ConnectionManager()
         conn = cm.create_connection()
         cursor = conn.cursor(as_dict=True)
-        cursor.execute("SELECT * FROM Vaccines")
-        print("-" * 42)
-        print("{: >10}\t{: >10}".format("Vaccine Name", "Number of Doses Available"))
-        print("-" * 42)
-        for row in cursor:
-            print("{: >10}\t{: >10}".format(row["Name"], row["Doses"]))
+        Queries.execute(cursor, "vaccine.all")
+        Renderer.render(["Vaccine Name", "Number of Doses Available"], ((row["Name"], row["Doses"]) for row in cursor))
     except pymssql.Error as e:
         print("Failed to retrieve vaccine information")
     except Exception as e:
@@ -633,9 +1229,64 @@ def get_vaccine_doses():  # Just a helpful method for people to see the vaccine
         cm.close_connection()
 
 
+def set_format(tokens):
+    #  set_format <text|csv|json>
+    if len(tokens) != 2:
+        print("Please enter one of the formats: " + ", ".join(Renderer.FORMATS))
+        return
+    try:
+        Renderer.set_format(tokens[1])
+    except ValueError as e:
+        print("Error:", e)
+        return
+    print("Output format set to", Renderer.output_format)
+
+
+def use_site(tokens):
+    #  use_site <site>: reservations, availability and doses go to this site's database from now on
+    if len(tokens) != 2:
+        print("Please enter one of the sites: " + ", ".join(ShardRouter.sites()))
+        return
+    try:
+        ShardRouter.use_site(tokens[1])
+    except ValueError as e:
+        print("Error:", e)
+        return
+    print("Using site", ShardRouter.active_site())
+
+
+def show_sites(tokens):
+    sites = ShardRouter.sites()
+    if len(sites) == 0:
+        print("No sites are configured; everything uses the primary database")
+        return
+    active = ShardRouter.active_site()
+    Renderer.render(["Site", "Database", "Active"],
+                    [(site, db_name, "yes" if site == active else "") for site, db_name in sites.items()])
+
+
+def profile(tokens):
+    #  profile <on [directory]|off>: profile every following command, or profile <command> [args] for just one
+    global profiler
+    if len(tokens) < 2:
+        print("Please use: profile on [directory], profile off, or profile <command> [args]")
+        return False
+    if tokens[1].lower() == "on" and len(tokens) <= 3:
+        profiler = Profiler(tokens[2] if len(tokens) == 3 else PROFILE_DIRECTORY)
+        print("Profiling every command into", profiler.directory)
+        return False
+    if tokens[1].lower() == "off" and len(tokens) == 2:
+        profiler = None
+        print("Profiling off")
+        return False
+    command = [tokens[1].lower()] + tokens[2:]
+    if command[0] == "profile":
+        print("Please use: profile on [directory], profile off, or profile <command> [args]")
+        return False
+    return (profiler or Profiler(PROFILE_DIRECTORY)).run(command[0], dispatch, command)
+
+
 def start():
-    global current_caregiver
-    global current_patient
     stop = False
     base_menu()  # I put the menu into a function because I made a 'help' command to display the menu
     while not stop:
@@ -652,45 +1303,97 @@ def start():
         if len(tokens) == 0:
             ValueError("Please try again!")
             continue
-        operation = tokens[0]
-        if operation == "create_patient" and (current_caregiver == current_patient):
-            create_patient(tokens)
-        elif operation == "create_caregiver" and (current_caregiver == current_patient):
-            create_caregiver(tokens)
-        elif operation == "login_patient" and (current_caregiver == current_patient):
-            login_patient(tokens)
-        elif operation == "login_caregiver" and (current_caregiver == current_patient):
-            login_caregiver(tokens)
-        elif operation == "search_caregiver_schedule":
-            search_caregiver_schedule(tokens)
-        elif operation == "reserve" and current_patient is not None:
-            reserve(tokens)
-        elif operation == "upload_availability" and current_caregiver is not None:
-            upload_availability(tokens)
-        elif operation == "cancel" and (current_caregiver is not None or current_patient is not None):
-            cancel(tokens)
-        elif operation == "show_all_available_dates":
-            show_all_available_dates(tokens)
-        elif operation == "add_doses" and current_caregiver is not None:
-            add_doses(tokens)
-        elif operation == "get_vaccine_information":
-            get_vaccine_doses()
-        elif operation == "show_appointments" and (current_caregiver is not None or current_patient is not None):
-            show_appointments(tokens)
-        elif operation == "logout" and (current_caregiver is not None or current_patient is not None):
-            logout(tokens)
-        elif operation == "help":
-            if current_caregiver is not None:
-                caregiver_menu()
-            if current_patient is not None:
-                patient_menu()
-            else:
-                base_menu()
-        elif operation == "quit":
-            print("Bye!")
-            stop = True
+        reaper_error = hold_reaper.take_error()
+        if reaper_error is not None:
+            print("Warning: expired holds could not be released yet:", reaper_error)
+            print("")
+        if tokens[0] == "profile" or profiler is None:
+            stop = dispatch(tokens)
         else:
-            print("Invalid operation name!")
+            stop = profiler.run(tokens[0], dispatch, tokens)
+
+
+# Run one command; returns True when the program should stop
+def dispatch(tokens):
+    operation = tokens[0]
+    if snapshot is not None and operation not in OFFLINE_OPERATIONS:
+        print("Only these commands are available in offline mode: " + ", ".join(OFFLINE_OPERATIONS))
+        return False
+    if operation == "create_patient" and (current_caregiver == current_patient):
+        create_patient(tokens)
+    elif operation == "create_caregiver" and (current_caregiver == current_patient):
+        create_caregiver(tokens)
+    elif operation == "login_patient" and (current_caregiver == current_patient):
+        login_patient(tokens)
+    elif operation == "login_caregiver" and (current_caregiver == current_patient):
+        login_caregiver(tokens)
+    elif operation == "search_caregiver_schedule":
+        search_caregiver_schedule(tokens)
+    elif operation == "reserve" and current_patient is not None:
+        reserve(tokens)
+    elif operation == "reserve_next" and current_patient is not None:
+        reserve_next(tokens)
+    elif operation == "hold" and current_patient is not None:
+        hold(tokens)
+    elif operation == "confirm" and current_patient is not None:
+        confirm(tokens)
+    elif operation == "upload_availability" and current_caregiver is not None:
+        upload_availability(tokens)
+    elif operation == "upload_availability_range" and current_caregiver is not None:
+        upload_availability_range(tokens)
+    elif operation == "cancel" and (current_caregiver is not None or current_patient is not None):
+        cancel(tokens)
+    elif operation == "show_all_available_dates":
+        show_all_available_dates(tokens)
+    elif operation == "calendar":
+        calendar(tokens)
+    elif operation == "add_doses" and current_caregiver is not None:
+        add_doses(tokens)
+    elif operation == "get_vaccine_information":
+        get_vaccine_doses()
+    elif operation == "show_appointments" and (current_caregiver is not None or current_patient is not None):
+        show_appointments(tokens)
+    elif operation == "logout" and (current_caregiver is not None or current_patient is not None):
+        logout(tokens)
+    elif operation == "report" and current_caregiver is not None:
+        report(tokens)
+    elif operation == "archive" and current_caregiver is not None:
+        archive(tokens)
+    elif operation == "show_events" and current_caregiver is not None:
+        show_events(tokens)
+    elif operation == "replay_journal" and current_caregiver is not None:
+        replay_journal(tokens)
+    elif operation == "forecast_doses" and current_caregiver is not None:
+        forecast_doses(tokens)
+    elif operation == "staffing_gaps" and current_caregiver is not None:
+        staffing_gaps(tokens)
+    elif operation == "export_snapshot" and current_caregiver is not None:
+        export_snapshot(tokens)
+    elif operation == "offline" and len(tokens) == 2 and (current_caregiver == current_patient):
+        go_offline(tokens[1])
+    elif operation == "online":
+        go_online()
+    elif operation == "set_format":
+        set_format(tokens)
+    elif operation == "use_site":
+        use_site(tokens)
+    elif operation == "sites":
+        show_sites(tokens)
+    elif operation == "profile":
+        return profile(tokens)
+    elif operation == "help":
+        if current_caregiver is not None:
+            caregiver_menu()
+        if current_patient is not None:
+            patient_menu()
+        else:
+            base_menu()
+    elif operation == "quit":
+        print("Bye!")
+        return True
+    else:
+        print("Invalid operation name!")
+    return False
 
 
 def caregiver_menu():
@@ -698,12 +1401,25 @@ def caregiver_menu():
     print(" *** Please enter one of the following commands *** ")
     print("> search_caregiver_schedule <date>")
     print("> upload_availability <date>")
-    print("> cancel <appointment_id>")
+    print("> upload_availability_range <start_date> <end_date> <daily|weekdays|weekly> [capacity]")
+    print("> cancel <appointment_id> [site]")
     print("> show_all_available_dates")
+    print("> calendar <start_date> <end_date> [vaccine]")
     print("> add_doses <vaccine> <number>")
     print("> get_vaccine_information")
-    print("> show_appointments")
+    print("> show_appointments [all]")
+    print("> report <daily_appointments|caregiver_utilization|dose_burndown> <file.csv>")
+    print("> archive [retention_days] [batch_size]")
+    print("> show_events [after_seq] [limit]")
+    print("> replay_journal [apply|checkpoint]")
+    print("> forecast_doses [trailing_days]")
+    print("> staffing_gaps <start_date> <end_date> [trailing_days]")
+    print("> calendar rebuild")
+    print("> export_snapshot <file>")
     print("> logout")
+    print("> set_format <text|csv|json>")
+    print("> sites / use_site <site>")
+    print("> profile <on [directory]|off|command [args]>")
     print("> help (see this menu again)")
     print("> quit")
 
@@ -713,11 +1429,17 @@ def patient_menu():
     print(" *** Please enter one of the following commands *** ")
     print("> search_caregiver_schedule <date>")
     print("> reserve <date> <vaccine>")
-    print("> cancel <appointment_id>")
+    print("> reserve_next <date> <vaccine> [window_days]")
+    print("> hold <date> <vaccine> / confirm <hold_id>")
+    print("> cancel <appointment_id> [site]")
     print("> show_all_available_dates")
+    print("> calendar <start_date> <end_date> [vaccine]")
     print("> get_vaccine_information")
-    print("> show_appointments")
+    print("> show_appointments [all]")
     print("> logout")
+    print("> set_format <text|csv|json>")
+    print("> sites / use_site <site>")
+    print("> profile <on [directory]|off|command [args]>")
     print("> help (see this menu again)")
     print("> quit")
 
@@ -731,7 +1453,12 @@ def base_menu():
     print("> login_caregiver <username> <password>")
     print("> search_caregiver_schedule <date>")
     print("> show_all_available_dates")
+    print("> calendar <start_date> <end_date> [vaccine]")
     print("> get_vaccine_information")
+    print("> offline <snapshot_file> / online")
+    print("> set_format <text|csv|json>")
+    print("> sites / use_site <site>")
+    print("> profile <on [directory]|off|command [args]>")
     print("> help (see this menu again)")
     print("> quit")
 
@@ -744,6 +1471,30 @@ if __name__ == "__main__":
     // and then construct a map of vaccineName -> vaccineObject
     '''
 
+    # Output format for result tables: "--format csv" on the command line, or the SCHEDULER_FORMAT variable
+    output_format = os.getenv("SCHEDULER_FORMAT", "text")
+    if "--format" in sys.argv[1:-1]:
+        output_format = sys.argv[sys.argv.index("--format") + 1]
+    try:
+        Renderer.set_format(output_format)
+    except ValueError as e:
+        print("Error:", e)
+        quit()
+
+    # Offline mode: "--snapshot <file>" on the command line, or the SCHEDULER_SNAPSHOT variable
+    snapshot_path = os.getenv("SCHEDULER_SNAPSHOT")
+    if "--snapshot" in sys.argv[1:-1]:
+        snapshot_path = sys.argv[sys.argv.index("--snapshot") + 1]
+    if snapshot_path:
+        go_offline(snapshot_path)
+    else:
+        try:
+            username_filter.rebuild()
+        except pymssql.Error as e:  # without the filters every signup simply does the pre-check
+            print("Could not load existing usernames; continuing without the username filter")
+            print("Db-Error:", e)
+        hold_reaper.start()
+
     # start command line
     print()
     print("Welcome to the COVID-19 Vaccine Reservation Scheduling Application!")
@@ -0,0 +1,53 @@
+import datetime
+import time
+from db.ConnectionManager import ConnectionManager
+from db.Journal import Journal
+from db import Queries
+import pymssql
+
+
+class Archiver:
+    RETENTION_DAYS = 30
+    BATCH_SIZE = 500
+    PAUSE_SECONDS = 0.05  # short pause between batches so other commands can get their locks
+
+    def __init__(self, retention_days=RETENTION_DAYS, batch_size=BATCH_SIZE):
+        if retention_days < 0 or batch_size <= 0:
+            raise ValueError("Retention days and batch size must be positive!")
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+    # Move old appointments into AppointmentsArchive and delete availability that is already in the past. Purged
+    # single-day availability is journalled by the same statement, so replaying the journal does not bring it back.
+    # Returns the number of rows handled for each step.
+    def run(self):
+        today = datetime.date.today()
+        cutoff = today - datetime.timedelta(days=self.retention_days)
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        try:
+            return {
+                "appointments archived": self._in_batches(conn, "archive.appointments", cutoff),
+                "availabilities purged": self._in_batches(conn, "archive.purge_availabilities", today,
+                                                          Journal.AVAILABILITY_PURGED),
+                "booked interval days purged": self._in_batches(conn, "archive.purge_interval_exceptions", today),
+                "intervals purged": self._in_batches(conn, "archive.purge_intervals", today),
+                "summary days purged": self._in_batches(conn, "archive.purge_summary", today),
+            }
+        except pymssql.Error:
+            raise
+        finally:
+            cm.close_connection()
+
+    # Each batch is its own short transaction; stop once a batch comes back smaller than the batch size
+    def _in_batches(self, conn, query_id, cutoff, *args):
+        cursor = conn.cursor()
+        total = 0
+        while True:
+            Queries.execute(cursor, query_id, (self.batch_size, cutoff) + args)
+            count = cursor.rowcount
+            conn.commit()
+            total += count
+            if count < self.batch_size:
+                return total
+            time.sleep(Archiver.PAUSE_SECONDS)
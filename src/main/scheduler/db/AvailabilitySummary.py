@@ -0,0 +1,66 @@
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+import pymssql
+
+
+class AvailabilitySummary:
+    '''
+    The AvailabilitySummary table holds one row per date with the number of open slots on it, counting single-day
+    availability and unbooked interval capacity. Every change to availability adjusts it on the caller's connection,
+    so it commits (or rolls back) together with the change. Calendar views read only this table: a range seek on
+    its primary key, however many caregivers there are.
+    '''
+
+    # Add change (negative to take slots away) to the open slots of one day
+    @staticmethod
+    def adjust(conn, day, change):
+        Queries.execute(conn.cursor(), "summary.adjust", (day, change))
+
+    # Add the same change to every given (distinct) day, e.g. the occurrences of a new availability interval. The
+    # days go to the server as one comma separated list, so a year of days is still a single MERGE.
+    @staticmethod
+    def adjust_days(conn, days, change):
+        days = ",".join(day.isoformat() for day in days)
+        if days != "":
+            Queries.execute(conn.cursor(), "summary.adjust_days", (days, change))
+
+    # Add a different change to each given day, from (day, change) pairs with distinct days. They are sent as one
+    # comma separated list of "yyyy-mm-dd:change" items, so this is also a single MERGE.
+    @staticmethod
+    def adjust_counts(conn, changes):
+        changes = ",".join("{}:{}".format(day.isoformat(), change) for day, change in changes)
+        if changes != "":
+            Queries.execute(conn.cursor(), "summary.adjust_counts", changes)
+
+    # Add (sign=1) or remove (sign=-1) the current contents of Availabilities, for bulk rewrites of that table
+    @staticmethod
+    def adjust_from_availabilities(conn, sign):
+        Queries.execute(conn.cursor(), "summary.adjust_from_availabilities", sign)
+
+    # Recount everything: single-day availability plus the given (day, open_slots) pairs for interval capacity
+    @staticmethod
+    def rebuild(conn, interval_slots):
+        Queries.execute(conn.cursor(), "summary.delete_all")
+        AvailabilitySummary.adjust_from_availabilities(conn, 1)
+        per_day = {}
+        for day, open_slots in interval_slots:
+            per_day[day] = per_day.get(day, 0) + open_slots
+        AvailabilitySummary.adjust_counts(conn, sorted(per_day.items()))
+
+    # [(date, open_slots)] for the days in [start, end] with open slots; with a vaccine also the number of
+    # appointments that can actually be booked, which is capped by its remaining doses
+    @staticmethod
+    def calendar(start, end, vaccine_name=None):
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        try:
+            cursor = conn.cursor()
+            if vaccine_name is None:
+                Queries.execute(cursor, "summary.calendar", (start, end))
+            else:
+                Queries.execute(cursor, "summary.calendar_for_vaccine", (vaccine_name, start, end))
+            return cursor.fetchall()
+        except pymssql.Error:
+            raise
+        finally:
+            cm.close_connection()
@@ -0,0 +1,4 @@
+class ConflictError(Exception):
+    # A row the command meant to claim was changed by another command first (a slot was taken, or the doses ran
+    # out). Nothing was written; trying again will look at the current state.
+    pass
@@ -1,14 +1,17 @@
 import pymssql
-import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from db.ShardRouter import ShardRouter
 
 
 class ConnectionManager:
 
-    def __init__(self):
-        self.server_name = os.getenv("Server") + ".database.windows.net"
-        self.db_name = os.getenv("DBName")
-        self.user = os.getenv("UserID")
-        self.password = os.getenv("Password")
+    # By default this connects to the database of the active site (see ShardRouter); primary=True connects to the
+    # primary database that holds the user accounts, and site picks a specific site
+    def __init__(self, primary=False, site=None):
+        self.site = None if primary else (site or ShardRouter.active_site())
+        server, self.db_name, self.user, self.password = ShardRouter.settings(self.site)
+        self.server_name = server + ".database.windows.net"
         self.conn = None
 
     def create_connection(self):
@@ -27,3 +30,36 @@ class ConnectionManager:
             print("Database Programming Error in SQL connection processing! ")
             print(db_err)
             quit()
+
+    # Run a unit of work on the caller's connection if one is given (the caller then commits), otherwise on a new
+    # connection that is committed and closed at the end
+    @staticmethod
+    @contextmanager
+    def transaction(conn=None, primary=False):
+        if conn is not None:
+            yield conn
+            return
+        cm = ConnectionManager(primary=primary)
+        conn = cm.create_connection()
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            cm.close_connection()
+
+    # Scatter-gather: run work(conn) against every site's database in parallel and return [(site, result)] in site
+    # order. Without configured sites the primary database is the only "site" (reported as None).
+    @staticmethod
+    def scatter(work):
+        sites = list(ShardRouter.sites()) or [None]
+
+        def run(site):
+            cm = ConnectionManager(primary=site is None, site=site)
+            conn = cm.create_connection()
+            try:
+                return work(conn)
+            finally:
+                cm.close_connection()
+
+        with ThreadPoolExecutor(max_workers=len(sites)) as pool:
+            return list(zip(sites, pool.map(run, sites)))
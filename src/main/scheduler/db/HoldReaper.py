@@ -0,0 +1,73 @@
+import threading
+import time
+from db.ConnectionManager import ConnectionManager
+from model.Hold import Hold
+
+
+class HoldReaper:
+    '''
+    Background thread that gives expired holds back to Availabilities and Vaccines. Every INTERVAL_SECONDS it takes
+    expired holds from every site's database in batches, each batch in its own short transaction (like the
+    Archiver), so it never blocks reservations for long.
+    '''
+    INTERVAL_SECONDS = 30
+    BATCH_SIZE = 100
+    PAUSE_SECONDS = 0.05
+
+    def __init__(self, interval_seconds=INTERVAL_SECONDS, batch_size=BATCH_SIZE):
+        if interval_seconds <= 0 or batch_size <= 0:
+            raise ValueError("Interval and batch size must be positive!")
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.stopping = threading.Event()
+        self.thread = None
+        self.last_error = None  # shown as a warning before the next command instead of interrupting the prompt
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="hold-reaper", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # The most recent failure since the last call, or None
+    def take_error(self):
+        with self.lock:
+            error, self.last_error = self.last_error, None
+        return error
+
+    def _run(self):
+        # Any failure is recorded and the next round tries again; the thread only ends when stopped
+        while not self.stopping.wait(self.interval_seconds):
+            try:
+                self.reap()
+            except SystemExit:  # ConnectionManager quits when it cannot connect
+                self._record_error(RuntimeError("could not connect to the database"))
+            except Exception as e:
+                self._record_error(e)
+
+    def _record_error(self, error):
+        with self.lock:
+            self.last_error = error
+
+    # Release every expired hold now; returns how many were released
+    def reap(self):
+        return sum(count for _, count in ConnectionManager.scatter(self._reap_site))
+
+    def _reap_site(self, conn):
+        total = 0
+        while True:
+            holds = Hold.take_expired(conn, self.batch_size)
+            Hold.release(conn, holds)
+            conn.commit()
+            total += len(holds)
+            if len(holds) < self.batch_size or self.stopping.is_set():
+                return total
+            time.sleep(HoldReaper.PAUSE_SECONDS)
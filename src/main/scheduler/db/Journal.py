@@ -0,0 +1,134 @@
+import time
+from collections import namedtuple
+from db.AvailabilitySummary import AvailabilitySummary
+from db.ConflictError import ConflictError
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+import pymssql
+
+JournalEvent = namedtuple("JournalEvent", ["seq", "event_type", "event_time", "day", "c_username", "p_username",
+                                           "vaccine_name", "a_id", "quantity"])
+
+
+class Journal:
+    RESERVATION_CREATED = "reservation_created"
+    RESERVATION_CANCELLED = "reservation_cancelled"
+    AVAILABILITY_ADDED = "availability_added"
+    AVAILABILITY_CLAIMED = "availability_claimed"
+    AVAILABILITY_PURGED = "availability_purged"  # past availability deleted by the archiver
+    INTERVAL_ADDED = "interval_added"
+    INTERVAL_BOOKED = "interval_booked"
+    INTERVAL_RELEASED = "interval_released"
+    DOSES_CHANGED = "doses_changed"
+    HOLD_PLACED = "hold_placed"
+    HOLD_CONFIRMED = "hold_confirmed"
+    HOLD_EXPIRED = "hold_expired"
+    # A checkpoint is followed by one baseline event per availability row and per vaccine (with its absolute stock)
+    CHECKPOINT = "checkpoint"
+    AVAILABILITY_BASELINE = "availability_baseline"
+    DOSES_BASELINE = "doses_baseline"
+
+    # Append an event on the given connection; it becomes visible when the caller commits its change
+    @staticmethod
+    def record(conn, event_type, day=None, c_username=None, p_username=None, vaccine_name=None, a_id=None,
+               quantity=None):
+        Queries.execute(conn.cursor(), "journal.append",
+                        (event_type, day, c_username, p_username, vaccine_name, a_id, quantity))
+
+    # Consumer API: the next events after a sequence number, oldest first
+    @staticmethod
+    def tail(after_seq=0, limit=100):
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        try:
+            cursor = conn.cursor()
+            Queries.execute(cursor, "journal.tail", (limit, after_seq))
+            return [JournalEvent(*row) for row in cursor]
+        except pymssql.Error:
+            raise
+        finally:
+            cm.close_connection()
+
+    # Consumer API: yield events forever, polling for new ones when caught up
+    @staticmethod
+    def follow(after_seq=0, poll_seconds=1.0, limit=100):
+        while True:
+            events = Journal.tail(after_seq, limit)
+            for event in events:
+                after_seq = event.seq
+                yield event
+            if len(events) < limit:
+                time.sleep(poll_seconds)
+
+    # Copy the current availability and vaccine stock into the journal, so later rebuilds start from there instead
+    # of from the first event. Run this once when the journal is added to a database that already has data.
+    @staticmethod
+    def checkpoint():
+        with ConnectionManager.transaction() as conn:
+            cursor = conn.cursor()
+            Queries.execute(cursor, "journal.lock_availabilities")
+            Queries.execute(cursor, "journal.lock_vaccines")
+            Journal.record(conn, Journal.CHECKPOINT)
+            Queries.execute(cursor, "journal.baseline_availabilities", Journal.AVAILABILITY_BASELINE)
+            Queries.execute(cursor, "journal.baseline_doses", Journal.DOSES_BASELINE)
+            return Queries.execute(cursor, "journal.last_of_type", Journal.CHECKPOINT).fetchone()[0]
+
+    # Rebuild single-day availability and vaccine stock by replaying the journal from the last checkpoint (or from
+    # the start when there is none). Interval availability lives in its own tables and is not part of the rebuilt
+    # state. Returns (availabilities, doses, checkpoint_seq, through_seq); checkpoint_seq is None without a
+    # checkpoint. Vaccine names are matched case-insensitively, like the database does.
+    @staticmethod
+    def rebuild():
+        availabilities = set()
+        doses = {}
+        names = {}
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        try:
+            cursor = conn.cursor()
+            through_seq = Queries.execute(cursor, "journal.last_seq").fetchone()[0]
+            checkpoint_seq = Queries.execute(cursor, "journal.last_of_type", Journal.CHECKPOINT).fetchone()[0]
+            Queries.execute(cursor, "journal.replay", (checkpoint_seq or 0, through_seq))
+            for row in cursor:
+                event = JournalEvent(*row)
+                if event.event_type in (Journal.AVAILABILITY_ADDED, Journal.AVAILABILITY_BASELINE):
+                    availabilities.add((event.day, event.c_username))
+                elif event.event_type in (Journal.AVAILABILITY_CLAIMED, Journal.AVAILABILITY_PURGED):
+                    availabilities.discard((event.day, event.c_username))
+                elif event.event_type in (Journal.DOSES_CHANGED, Journal.DOSES_BASELINE):
+                    key = event.vaccine_name.lower()
+                    names.setdefault(key, event.vaccine_name)
+                    base = 0 if event.event_type == Journal.DOSES_BASELINE else doses.get(key, 0)
+                    doses[key] = base + event.quantity
+        except pymssql.Error:
+            raise
+        finally:
+            cm.close_connection()
+        return sorted(availabilities), {names[key]: count for key, count in doses.items()}, checkpoint_seq, through_seq
+
+    # Overwrite Availabilities and vaccine stock with rebuilt state in one transaction. This replaces the tables, so
+    # it is refused unless the rebuild started from a checkpoint, no stock came out negative and no event was
+    # written since the rebuild.
+    @staticmethod
+    def apply(availabilities, doses, checkpoint_seq, through_seq):
+        if checkpoint_seq is None:
+            raise ValueError("The journal has no checkpoint, so rows older than the journal would be lost; "
+                             "run replay_journal checkpoint first")
+        negative = sorted(name for name, count in doses.items() if count < 0)
+        if len(negative) > 0:
+            raise ValueError("Rebuilt stock is negative for: " + ", ".join(negative))
+        with ConnectionManager.transaction() as conn:
+            cursor = conn.cursor()
+            Queries.execute(cursor, "journal.lock_availabilities")
+            Queries.execute(cursor, "journal.lock_vaccines")
+            if Queries.execute(cursor, "journal.last_seq").fetchone()[0] != through_seq:
+                raise ConflictError("New events were written since the rebuild; replay the journal again")
+            AvailabilitySummary.adjust_from_availabilities(conn, -1)  # swap the old single-day slots for the new
+            Queries.execute(cursor, "availability.delete_all")
+            if len(availabilities) > 0:
+                Queries.execute_many(cursor, "availability.insert", availabilities)
+            AvailabilitySummary.adjust_from_availabilities(conn, 1)
+            for vaccine_name, count in doses.items():
+                Queries.execute(cursor, "vaccine.set_doses", (count, vaccine_name))
+                if cursor.rowcount == 0:
+                    Queries.execute(cursor, "vaccine.insert", (vaccine_name, count))
@@ -0,0 +1,382 @@
+'''
+Central registry of every SQL statement used by the scheduler.
+
+Each statement is defined exactly once under a stable id (e.g. "vaccine.get"). Parameters are declared with
+their SQL Server types and referenced in the text as @name. pymssql has no server-side prepare call, so when a
+statement is first used it is "prepared" into an sp_executesql call: the statement text stays constant and the
+values are passed as typed parameters, which lets SQL Server cache and reuse one plan per statement instead of
+compiling every literal-substituted variation. The statement id is embedded as a comment so it shows up in the
+plan cache / Query Store under the same name.
+'''
+
+
+class Query:
+    def __init__(self, query_id, sql, params=()):
+        self.query_id = query_id
+        self.sql = sql
+        self.params = params  # sequence of (name, sql_type) in the order values are bound
+        self.prepared = None
+
+    def prepare(self):
+        # Build (once) the text that is sent to the driver for this statement
+        if self.prepared is None:
+            tagged = "/* {} */ {}".format(self.query_id, self.sql)
+            if len(self.params) == 0:
+                self.prepared = tagged  # executed without parameters, so the driver does no % substitution
+            else:
+                declarations = ", ".join("@{} {}".format(name, sql_type) for name, sql_type in self.params)
+                assignments = ", ".join("@{} = %s".format(name) for name, _ in self.params)
+                self.prepared = "EXEC sp_executesql N'{}', N'{}', {}".format(
+                    tagged.replace("'", "''").replace("%", "%%"), declarations, assignments)
+        return self.prepared
+
+    def bind(self, args):
+        if not isinstance(args, (tuple, list)):
+            args = (args,)
+        if len(args) != len(self.params):
+            raise ValueError("Query {} expects {} parameters, got {}".format(self.query_id, len(self.params),
+                                                                             len(args)))
+        return tuple(args)
+
+
+QUERIES = {}
+
+USERNAME = "varchar(255)"
+DATE = "date"
+BINARY = "binary(16)"
+INT = "int"
+
+
+def register(query_id, sql, *params):
+    if query_id in QUERIES:
+        raise ValueError("Duplicate query id: " + query_id)
+    QUERIES[query_id] = Query(query_id, sql, params)
+    return QUERIES[query_id]
+
+
+def get(query_id):
+    return QUERIES[query_id]
+
+
+def execute(cursor, query_id, args=()):
+    # Run a registered statement on the given cursor; results are read from the cursor as usual
+    query = QUERIES[query_id]
+    if len(query.params) == 0:
+        cursor.execute(query.prepare())
+    else:
+        cursor.execute(query.prepare(), query.bind(args))
+    return cursor
+
+
+def execute_many(cursor, query_id, rows):
+    # Run a registered statement once per parameter tuple. pymssql sends each one as its own round trip, so use a
+    # set-based statement instead where the number of rows can grow large
+    query = QUERIES[query_id]
+    cursor.executemany(query.prepare(), [query.bind(row) for row in rows])
+    return cursor
+
+
+# Patients
+register("patient.username_exists", "SELECT Username FROM Patients WHERE Username = @username",
+         ("username", USERNAME))
+register("patient.get_credentials", "SELECT Salt, Hash FROM Patients WHERE Username = @username",
+         ("username", USERNAME))
+register("patient.count", "SELECT COUNT(*) FROM Patients")
+register("patient.all_usernames", "SELECT Username FROM Patients")
+register("patient.insert", "INSERT INTO Patients (Username, Salt, Hash) VALUES (@username, @salt, @hash)",
+         ("username", USERNAME), ("salt", BINARY), ("hash", BINARY))
+
+# Caregivers
+register("caregiver.username_exists", "SELECT Username FROM Caregivers WHERE Username = @username",
+         ("username", USERNAME))
+register("caregiver.get_credentials", "SELECT Salt, Hash FROM Caregivers WHERE Username = @username",
+         ("username", USERNAME))
+register("caregiver.count", "SELECT COUNT(*) FROM Caregivers")
+register("caregiver.all_usernames", "SELECT Username FROM Caregivers")
+register("caregiver.insert", "INSERT INTO Caregivers (Username, Salt, Hash) VALUES (@username, @salt, @hash)",
+         ("username", USERNAME), ("salt", BINARY), ("hash", BINARY))
+
+# Availabilities
+register("availability.insert", "INSERT INTO Availabilities (Time, Username) VALUES (@time, @username)",
+         ("time", DATE), ("username", USERNAME))
+register("availability.by_date", "SELECT Time, Username FROM Availabilities WHERE Time = @time ORDER BY Username",
+         ("time", DATE))
+register("availability.first_by_date",
+         "SELECT TOP 1 Time, Username FROM Availabilities WHERE Time = @time ORDER BY Username",
+         ("time", DATE))
+register("availability.first_on_or_after",
+         "SELECT TOP 1 a.Time, a.Username FROM Availabilities a "
+         "JOIN Vaccines v ON v.Name = @vaccine_name AND v.Doses > 0 "
+         "WHERE a.Time >= @start_date AND a.Time <= @end_date ORDER BY a.Time, a.Username",
+         ("vaccine_name", USERNAME), ("start_date", DATE), ("end_date", DATE))
+register("availability.delete", "DELETE FROM Availabilities WHERE Time = @time AND Username = @username",
+         ("time", DATE), ("username", USERNAME))
+register("availability.insert_missing",
+         "INSERT INTO Availabilities (Time, Username) SELECT @time, @username WHERE NOT EXISTS "
+         "(SELECT 1 FROM Availabilities WITH (UPDLOCK, HOLDLOCK) WHERE Time = @time AND Username = @username)",
+         ("time", DATE), ("username", USERNAME))
+register("availability.all", "SELECT Time, Username FROM Availabilities ORDER BY Time, Username")
+
+# Vaccines
+register("vaccine.all", "SELECT Name, Doses FROM Vaccines ORDER BY Name")
+register("vaccine.names", "SELECT Name FROM Vaccines ORDER BY Name")
+register("vaccine.get", "SELECT Name, Doses FROM Vaccines WHERE Name = @name",
+         ("name", USERNAME))
+register("vaccine.insert", "INSERT INTO Vaccines (Name, Doses) VALUES (@name, @doses)",
+         ("name", USERNAME), ("doses", INT))
+register("vaccine.set_doses", "UPDATE Vaccines SET Doses = @doses WHERE Name = @name",
+         ("doses", INT), ("name", USERNAME))
+register("vaccine.change_doses",
+         "UPDATE Vaccines SET Doses = Doses + @change WHERE Name = @name AND Doses + @change >= 0",
+         ("change", INT), ("name", USERNAME))
+
+# Appointments
+# Archived ids are included so an id is never handed out twice
+register("appointment.max_id",
+         "SELECT MAX(a_id) FROM (SELECT MAX(a_id) AS a_id FROM Appointments "
+         "UNION ALL SELECT MAX(a_id) FROM AppointmentsArchive) ids")
+register("appointment.insert",
+         "INSERT INTO Appointments (a_id, date, p_username, c_username, vaccine_name) "
+         "VALUES (@a_id, @date, @p_username, @c_username, @vaccine_name)",
+         ("a_id", INT), ("date", DATE), ("p_username", USERNAME), ("c_username", USERNAME),
+         ("vaccine_name", USERNAME))
+register("appointment.get_booked",
+         "SELECT a_id, date, c_username, vaccine_name FROM Appointments "
+         "WHERE p_username = @p_username AND c_username = @c_username AND date = @date",
+         ("p_username", USERNAME), ("c_username", USERNAME), ("date", DATE))
+register("appointment.get", "SELECT a_id, date, p_username, c_username, vaccine_name FROM Appointments WHERE a_id = @a_id",
+         ("a_id", INT))
+register("appointment.delete", "DELETE FROM Appointments WHERE a_id = @a_id",
+         ("a_id", INT))
+register("appointment.by_patient",
+         "SELECT a_id, vaccine_name, date, c_username FROM Appointments WHERE p_username = @username ORDER BY a_id",
+         ("username", USERNAME))
+register("appointment.by_caregiver",
+         "SELECT a_id, vaccine_name, date, p_username FROM Appointments WHERE c_username = @username ORDER BY a_id",
+         ("username", USERNAME))
+register("appointment.by_patient_with_archive",
+         "SELECT a_id, vaccine_name, date, c_username FROM Appointments WHERE p_username = @username "
+         "UNION ALL SELECT a_id, vaccine_name, date, c_username FROM AppointmentsArchive WHERE p_username = @username "
+         "ORDER BY a_id",
+         ("username", USERNAME))
+register("appointment.by_caregiver_with_archive",
+         "SELECT a_id, vaccine_name, date, p_username FROM Appointments WHERE c_username = @username "
+         "UNION ALL SELECT a_id, vaccine_name, date, p_username FROM AppointmentsArchive WHERE c_username = @username "
+         "ORDER BY a_id",
+         ("username", USERNAME))
+
+# Reports (aggregated on the server, one row per group)
+register("report.daily_appointments",
+         "SELECT date AS Date, vaccine_name AS Vaccine, COUNT(*) AS Appointments "
+         "FROM (SELECT date, vaccine_name FROM Appointments "
+         "UNION ALL SELECT date, vaccine_name FROM AppointmentsArchive) a "
+         "GROUP BY date, vaccine_name ORDER BY date, vaccine_name")
+# Open slots per interval = occurrences * capacity - booked. Occurrences are counted in closed form from the day
+# count n and the start weekday w (0 = Monday; 1900-01-01 was a Monday): weekly is ceil(n / 7), weekdays is five
+# per full week plus the leftover days that are not a Saturday (w + k = 5) or Sunday (w + k = 6).
+INTERVAL_OCCURRENCES = (
+    "CASE i.Recurrence WHEN 'daily' THEN k.n WHEN 'weekly' THEN (k.n + 6) / 7 "
+    "ELSE k.n / 7 * 5 + k.n % 7 "
+    "- CASE WHEN k.w <= 5 AND 5 <= k.w + k.n % 7 - 1 THEN 1 ELSE 0 END "
+    "- CASE WHEN k.w <= 6 AND 6 <= k.w + k.n % 7 - 1 THEN 1 ELSE 0 END END")
+register("report.caregiver_utilization",
+         "SELECT c.Username AS Caregiver, COALESCE(b.Booked, 0) AS Booked, COALESCE(o.OpenSlots, 0) AS OpenSlots, "
+         "CAST(COALESCE(b.Booked, 0) AS float) / NULLIF(COALESCE(b.Booked, 0) + COALESCE(o.OpenSlots, 0), 0) "
+         "AS Utilization "
+         "FROM (SELECT c_username AS Username FROM Appointments "
+         "UNION SELECT Username FROM Availabilities "
+         "UNION SELECT Username FROM AvailabilityIntervals) c "  # no Caregivers join: site databases hold no accounts
+         "LEFT JOIN (SELECT c_username, COUNT(*) AS Booked FROM Appointments GROUP BY c_username) b "
+         "ON b.c_username = c.Username "
+         "LEFT JOIN (SELECT Username, SUM(Slots) AS OpenSlots FROM ("
+         "SELECT Username, COUNT(*) AS Slots FROM Availabilities GROUP BY Username "
+         "UNION ALL SELECT i.Username, i.Capacity * (" + INTERVAL_OCCURRENCES + ") - COALESCE(e.Booked, 0) "
+         "FROM AvailabilityIntervals i "
+         "CROSS APPLY (SELECT DATEDIFF(day, i.StartDate, i.EndDate) + 1 AS n, "
+         "DATEDIFF(day, '19000101', i.StartDate) % 7 AS w) k "
+         "LEFT JOIN (SELECT i_id, SUM(Booked) AS Booked FROM AvailabilityExceptions GROUP BY i_id) e "
+         "ON e.i_id = i.i_id) slots GROUP BY Username) o "
+         "ON o.Username = c.Username "
+         "ORDER BY c.Username")
+register("report.dose_burndown",
+         "SELECT a.vaccine_name AS Vaccine, a.date AS Date, a.Administered, "
+         "v.Doses + SUM(a.Administered) OVER (PARTITION BY a.vaccine_name ORDER BY a.date DESC "
+         "ROWS UNBOUNDED PRECEDING) - a.Administered AS RemainingAfter "
+         "FROM (SELECT date, vaccine_name, COUNT(*) AS Administered "
+         "FROM (SELECT date, vaccine_name FROM Appointments "
+         "UNION ALL SELECT date, vaccine_name FROM AppointmentsArchive) h "
+         "GROUP BY date, vaccine_name) a "
+         "JOIN Vaccines v ON v.Name = a.vaccine_name "
+         "ORDER BY a.vaccine_name, a.date")
+
+# Availability intervals
+register("interval.insert",
+         "INSERT INTO AvailabilityIntervals (Username, StartDate, EndDate, Recurrence, Capacity) "
+         "VALUES (@username, @start_date, @end_date, @recurrence, @capacity)",
+         ("username", USERNAME), ("start_date", DATE), ("end_date", DATE), ("recurrence", "varchar(16)"),
+         ("capacity", INT))
+register("interval.overlapping",
+         "SELECT i_id, Username, StartDate, EndDate, Recurrence, Capacity FROM AvailabilityIntervals "
+         "WHERE StartDate <= @end_date AND EndDate >= @start_date ORDER BY Username, i_id",
+         ("start_date", DATE), ("end_date", DATE))
+register("interval.exceptions",
+         "SELECT i_id, Day, Booked FROM AvailabilityExceptions WHERE Day BETWEEN @start_date AND @end_date",
+         ("start_date", DATE), ("end_date", DATE))
+register("interval.max_end_date", "SELECT MAX(EndDate) FROM AvailabilityIntervals")
+register("interval.book",
+         "UPDATE e SET Booked = e.Booked + 1 FROM AvailabilityExceptions e "
+         "JOIN AvailabilityIntervals i ON i.i_id = e.i_id "
+         "WHERE e.i_id = @i_id AND e.Day = @day AND e.Booked < i.Capacity",
+         ("i_id", INT), ("day", DATE))
+register("interval.book_first",
+         "INSERT INTO AvailabilityExceptions (i_id, Day, Booked) SELECT @i_id, @day, 1 "
+         "WHERE NOT EXISTS "
+         "(SELECT 1 FROM AvailabilityExceptions WITH (UPDLOCK, HOLDLOCK) WHERE i_id = @i_id AND Day = @day)",
+         ("i_id", INT), ("day", DATE))
+register("interval.release",
+         "UPDATE TOP (1) e SET Booked = e.Booked - 1 FROM AvailabilityExceptions e "
+         "JOIN AvailabilityIntervals i ON i.i_id = e.i_id "
+         "WHERE i.Username = @username AND e.Day = @day AND e.Booked > 0",
+         ("username", USERNAME), ("day", DATE))
+
+# Availability summary: open slots per date, kept up to date in the same transaction as every availability change
+register("summary.adjust",
+         "MERGE AvailabilitySummary WITH (HOLDLOCK) AS s USING (SELECT @day AS Day) AS d ON s.Day = d.Day "
+         "WHEN MATCHED THEN UPDATE SET OpenSlots = s.OpenSlots + @change "
+         "WHEN NOT MATCHED THEN INSERT (Day, OpenSlots) VALUES (@day, @change);",
+         ("day", DATE), ("change", INT))
+register("summary.adjust_days",
+         "MERGE AvailabilitySummary WITH (HOLDLOCK) AS s "
+         "USING (SELECT CAST(value AS date) AS Day FROM STRING_SPLIT(@days, ',')) AS d ON s.Day = d.Day "
+         "WHEN MATCHED THEN UPDATE SET OpenSlots = s.OpenSlots + @change "
+         "WHEN NOT MATCHED THEN INSERT (Day, OpenSlots) VALUES (d.Day, @change);",
+         ("days", "varchar(max)"), ("change", INT))
+register("summary.adjust_counts",
+         "MERGE AvailabilitySummary WITH (HOLDLOCK) AS s "
+         "USING (SELECT CAST(LEFT(value, 10) AS date) AS Day, CAST(SUBSTRING(value, 12, 10) AS int) AS Change "
+         "FROM STRING_SPLIT(@counts, ',')) AS d ON s.Day = d.Day "
+         "WHEN MATCHED THEN UPDATE SET OpenSlots = s.OpenSlots + d.Change "
+         "WHEN NOT MATCHED THEN INSERT (Day, OpenSlots) VALUES (d.Day, d.Change);",
+         ("counts", "varchar(max)"))
+register("summary.adjust_from_availabilities",
+         "MERGE AvailabilitySummary WITH (HOLDLOCK) AS s "
+         "USING (SELECT Time AS Day, COUNT(*) AS Slots FROM Availabilities GROUP BY Time) AS a ON s.Day = a.Day "
+         "WHEN MATCHED THEN UPDATE SET OpenSlots = s.OpenSlots + @sign * a.Slots "
+         "WHEN NOT MATCHED THEN INSERT (Day, OpenSlots) VALUES (a.Day, @sign * a.Slots);",
+         ("sign", INT))
+register("summary.delete_all", "DELETE FROM AvailabilitySummary")
+register("summary.calendar",
+         "SELECT Day AS Date, OpenSlots FROM AvailabilitySummary "
+         "WHERE Day BETWEEN @start_date AND @end_date AND OpenSlots > 0 ORDER BY Day",
+         ("start_date", DATE), ("end_date", DATE))
+register("summary.calendar_for_vaccine",
+         "SELECT s.Day AS Date, s.OpenSlots, "
+         "CASE WHEN s.OpenSlots < v.Doses THEN s.OpenSlots ELSE v.Doses END AS Bookable "
+         "FROM AvailabilitySummary s JOIN Vaccines v ON v.Name = @vaccine_name AND v.Doses > 0 "
+         "WHERE s.Day BETWEEN @start_date AND @end_date AND s.OpenSlots > 0 ORDER BY s.Day",
+         ("vaccine_name", USERNAME), ("start_date", DATE), ("end_date", DATE))
+
+# Reservation holds; taking a hold deletes it, so confirm and the reaper can never both claim the same one
+HOLD_COLUMNS = "h_id, p_username, c_username, Day, vaccine_name, i_id, ExpiresAt"
+register("hold.insert",
+         "INSERT INTO Holds (p_username, c_username, Day, vaccine_name, i_id, ExpiresAt) "
+         "OUTPUT INSERTED.h_id, INSERTED.ExpiresAt "
+         "VALUES (@p_username, @c_username, @day, @vaccine_name, @i_id, "
+         "DATEADD(second, @ttl_seconds, SYSUTCDATETIME()))",
+         ("p_username", USERNAME), ("c_username", USERNAME), ("day", DATE), ("vaccine_name", USERNAME),
+         ("i_id", INT), ("ttl_seconds", INT))
+register("hold.take",
+         "DELETE FROM Holds OUTPUT " + ", ".join("DELETED." + column for column in HOLD_COLUMNS.split(", ")) + " "
+         "WHERE h_id = @h_id AND p_username = @p_username AND ExpiresAt > SYSUTCDATETIME()",
+         ("h_id", INT), ("p_username", USERNAME))
+register("hold.take_expired",
+         "DELETE TOP (@batch_size) FROM Holds OUTPUT " +
+         ", ".join("DELETED." + column for column in HOLD_COLUMNS.split(", ")) + " "
+         "WHERE ExpiresAt <= SYSUTCDATETIME()",
+         ("batch_size", INT))
+
+# Archival; each statement touches at most @batch_size rows so locks are held briefly
+register("archive.appointments",
+         "DELETE TOP (@batch_size) FROM Appointments "
+         "OUTPUT DELETED.a_id, DELETED.date, DELETED.p_username, DELETED.c_username, DELETED.vaccine_name "
+         "INTO AppointmentsArchive (a_id, date, p_username, c_username, vaccine_name) "
+         "WHERE date < @cutoff",
+         ("batch_size", INT), ("cutoff", DATE))
+register("archive.purge_availabilities",
+         "DELETE TOP (@batch_size) FROM Availabilities "
+         "OUTPUT @event_type, DELETED.Time, DELETED.Username INTO ReservationEvents (EventType, Day, c_username) "
+         "WHERE Time < @cutoff",
+         ("batch_size", INT), ("cutoff", DATE), ("event_type", "varchar(32)"))
+register("archive.purge_interval_exceptions",
+         "DELETE TOP (@batch_size) FROM AvailabilityExceptions WHERE Day < @cutoff",
+         ("batch_size", INT), ("cutoff", DATE))
+register("archive.purge_summary",
+         "DELETE TOP (@batch_size) FROM AvailabilitySummary WHERE Day < @cutoff",
+         ("batch_size", INT), ("cutoff", DATE))
+register("archive.purge_intervals",
+         "DELETE TOP (@batch_size) FROM AvailabilityIntervals WHERE EndDate < @cutoff "
+         "AND NOT EXISTS (SELECT 1 FROM AvailabilityExceptions e WHERE e.i_id = AvailabilityIntervals.i_id)",
+         ("batch_size", INT), ("cutoff", DATE))
+
+# Reservation event journal
+register("journal.append",
+         "INSERT INTO ReservationEvents (EventType, Day, c_username, p_username, vaccine_name, a_id, Quantity) "
+         "VALUES (@event_type, @day, @c_username, @p_username, @vaccine_name, @a_id, @quantity)",
+         ("event_type", "varchar(32)"), ("day", DATE), ("c_username", USERNAME), ("p_username", USERNAME),
+         ("vaccine_name", USERNAME), ("a_id", INT), ("quantity", INT))
+register("journal.tail",
+         "SELECT TOP (@limit) seq, EventType, EventTime, Day, c_username, p_username, vaccine_name, a_id, Quantity "
+         "FROM ReservationEvents WHERE seq > @after_seq ORDER BY seq",
+         ("limit", INT), ("after_seq", "bigint"))
+register("journal.replay",
+         "SELECT seq, EventType, EventTime, Day, c_username, p_username, vaccine_name, a_id, Quantity "
+         "FROM ReservationEvents WHERE seq >= @from_seq AND seq <= @through_seq ORDER BY seq",
+         ("from_seq", "bigint"), ("through_seq", "bigint"))
+register("journal.last_seq", "SELECT COALESCE(MAX(seq), 0) FROM ReservationEvents")
+register("journal.last_of_type", "SELECT MAX(seq) FROM ReservationEvents WHERE EventType = @event_type",
+         ("event_type", "varchar(32)"))
+# Checkpoints copy the current state into the journal; the table locks keep other writers out meanwhile
+register("journal.lock_availabilities", "SELECT COUNT(*) FROM Availabilities WITH (TABLOCKX, HOLDLOCK)")
+register("journal.lock_vaccines", "SELECT COUNT(*) FROM Vaccines WITH (TABLOCKX, HOLDLOCK)")
+register("journal.baseline_availabilities",
+         "INSERT INTO ReservationEvents (EventType, Day, c_username) "
+         "SELECT @event_type, Time, Username FROM Availabilities ORDER BY Time, Username",
+         ("event_type", "varchar(32)"))
+register("journal.baseline_doses",
+         "INSERT INTO ReservationEvents (EventType, vaccine_name, Quantity) "
+         "SELECT @event_type, Name, Doses FROM Vaccines ORDER BY Name",
+         ("event_type", "varchar(32)"))
+register("availability.delete_all", "DELETE FROM Availabilities")
+register("appointment.all",
+         "SELECT a_id, date, p_username, c_username, vaccine_name FROM Appointments ORDER BY date, a_id")
+
+# Analytics (pre-aggregated per day so only one row per day / vaccine crosses the wire)
+register("analytics.open_slots_per_day",
+         "SELECT Time, COUNT(*) FROM Availabilities WHERE Time BETWEEN @start_date AND @end_date GROUP BY Time",
+         ("start_date", DATE), ("end_date", DATE))
+
+# Login throttling
+register("throttle.lockout_seconds",
+         "SELECT DATEDIFF(second, SYSUTCDATETIME(), LockedUntil) + 1 FROM LoginThrottle "
+         "WHERE ThrottleKey = @throttle_key AND LockedUntil > SYSUTCDATETIME()",
+         ("throttle_key", "varchar(600)"))
+register("throttle.record_failure",
+         "MERGE LoginThrottle AS t USING (SELECT @throttle_key AS ThrottleKey) AS s ON t.ThrottleKey = s.ThrottleKey "
+         "WHEN MATCHED THEN UPDATE SET Failures = CASE "
+         "WHEN t.LastFailure IS NULL OR t.LastFailure < DATEADD(second, -@memory_seconds, SYSUTCDATETIME()) THEN 1 "
+         "ELSE t.Failures + 1 END, LastFailure = SYSUTCDATETIME() "
+         "WHEN NOT MATCHED THEN INSERT (ThrottleKey, Failures, LockedUntil, LastFailure) "
+         "VALUES (@throttle_key, 1, NULL, SYSUTCDATETIME()) "
+         "OUTPUT inserted.Failures;",
+         ("throttle_key", "varchar(600)"), ("memory_seconds", INT))
+register("throttle.lock",
+         "UPDATE LoginThrottle SET LockedUntil = DATEADD(second, @seconds, SYSUTCDATETIME()) "
+         "WHERE ThrottleKey = @throttle_key",
+         ("seconds", INT), ("throttle_key", "varchar(600)"))
+register("throttle.reset", "DELETE FROM LoginThrottle WHERE ThrottleKey = @throttle_key",
+         ("throttle_key", "varchar(600)"))
+register("throttle.sweep",
+         "DELETE TOP (@batch_size) FROM LoginThrottle "
+         "WHERE (LastFailure IS NULL OR LastFailure < DATEADD(second, -@memory_seconds, SYSUTCDATETIME())) "
+         "AND (LockedUntil IS NULL OR LockedUntil <= SYSUTCDATETIME())",
+         ("batch_size", INT), ("memory_seconds", INT))
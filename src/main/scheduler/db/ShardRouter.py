@@ -0,0 +1,54 @@
+import os
+
+
+class ShardRouter:
+    '''
+    Maps clinic sites to their own databases. Sites are configured with SCHEDULER_SITES as a comma separated list of
+    site:database pairs (e.g. "north:VaccinesNorth,south:VaccinesSouth"); a site's server and credentials default to
+    the usual Server / UserID / Password variables and can be overridden with Server_<site>, UserID_<site> and
+    Password_<site>.
+
+    Availability, appointments, vaccine inventory and everything derived from them live in the database of the
+    current site. Patients and caregivers (and login throttling) stay in the primary database from DBName, so one
+    account works at every site. Without SCHEDULER_SITES everything uses the primary database, as before.
+    '''
+    current_site = None
+
+    @staticmethod
+    def sites():
+        sites = {}
+        for entry in os.getenv("SCHEDULER_SITES", "").split(","):
+            if entry.strip() == "":
+                continue
+            site, _, db_name = entry.partition(":")
+            sites[site.strip().lower()] = db_name.strip() or site.strip()
+        return sites
+
+    @staticmethod
+    def is_sharded():
+        return len(ShardRouter.sites()) > 0
+
+    @staticmethod
+    def use_site(site):
+        site = site.lower()
+        if site not in ShardRouter.sites():
+            raise ValueError("Unknown site: " + site)
+        ShardRouter.current_site = site
+
+    # The site whose database site-scoped data goes to: the selected one, or the first configured site
+    @staticmethod
+    def active_site():
+        sites = ShardRouter.sites()
+        if ShardRouter.current_site in sites:
+            return ShardRouter.current_site
+        return next(iter(sites), None)
+
+    # (server, database, user, password) for a site; None means the primary database
+    @staticmethod
+    def settings(site):
+        if site is None:
+            return os.getenv("Server"), os.getenv("DBName"), os.getenv("UserID"), os.getenv("Password")
+        return (os.getenv("Server_" + site) or os.getenv("Server"),
+                ShardRouter.sites()[site],
+                os.getenv("UserID_" + site) or os.getenv("UserID"),
+                os.getenv("Password_" + site) or os.getenv("Password"))
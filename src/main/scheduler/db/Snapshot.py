@@ -0,0 +1,180 @@
+import bisect
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+from model.AvailabilityInterval import AvailabilityInterval
+
+'''
+Read-only snapshot of the Vaccines, Availabilities and Appointments tables in a compact columnar file.
+
+Layout: 8-byte magic, 4-byte header length, a JSON header, then every column as a contiguous int32 array (each
+starting on an 8-byte boundary). Dates are stored as day numbers (date.toordinal()) and usernames / vaccine names as
+indexes into string dictionaries kept in the header. Loading memory-maps the file and exposes each column as a
+memoryview over the map, so nothing is copied or parsed up front.
+'''
+
+
+class Snapshot:
+    MAGIC = b"VSNAP001"
+    # Interval availability is expanded into single days for this many days from the export date
+    INTERVAL_HORIZON_DAYS = 365
+
+    COLUMNS = {
+        "availability": ["day", "caregiver"],
+        "vaccines": ["name", "doses"],
+        "appointments": ["a_id", "day", "patient", "caregiver", "vaccine"],
+    }
+
+    HEADER_KEYS = ("created", "byteorder", "usernames", "vaccine_names", "columns")
+
+    def __init__(self, path):
+        self.path = path
+        self.view = None
+        self.columns = {}
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load()
+        except (KeyError, TypeError, ValueError, struct.error) as e:
+            self.close()
+            if isinstance(e, ValueError):
+                raise
+            raise ValueError("Corrupt snapshot file: " + path) from e
+
+    def _load(self):
+        if len(self.map) < 12 or self.map[:8] != Snapshot.MAGIC:
+            raise ValueError("Not a snapshot file: " + self.path)
+        header_length = struct.unpack_from("<I", self.map, 8)[0]
+        if 12 + header_length > len(self.map):
+            raise ValueError("Truncated snapshot file: " + self.path)
+        header = json.loads(bytes(self.map[12:12 + header_length]).decode("utf-8"))
+        missing = [key for key in Snapshot.HEADER_KEYS if key not in header]
+        if len(missing) > 0:
+            raise ValueError("Snapshot header is missing " + ", ".join(missing) + ": " + self.path)
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("Snapshot was written on a machine with a different byte order")
+        self.created = header["created"]
+        self.usernames = header["usernames"]
+        self.vaccine_names = header["vaccine_names"]
+        data_start = Snapshot._aligned(12 + header_length)
+        self.view = memoryview(self.map)
+        for name, (offset, count) in header["columns"].items():
+            start = data_start + offset
+            if start + count * 4 > len(self.map):
+                raise ValueError("Truncated snapshot file: " + self.path)
+            self.columns[name] = self.view[start:start + count * 4].cast("i")
+
+    def close(self):
+        # The map can only be closed once no memoryview points into it
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        self.map.close()
+
+    def column(self, table, name):
+        return self.columns[table + "." + name]
+
+    # Caregivers with an open slot on the given date, using a binary search on the sorted day column
+    def caregivers_on(self, day):
+        days = self.column("availability", "day")
+        caregivers = self.column("availability", "caregiver")
+        ordinal = day.toordinal()
+        start = bisect.bisect_left(days, ordinal)
+        end = bisect.bisect_right(days, ordinal, lo=start)
+        return [self.usernames[caregivers[i]] for i in range(start, end)]
+
+    def available_dates(self):
+        days = self.column("availability", "day")
+        caregivers = self.column("availability", "caregiver")
+        for i in range(len(days)):
+            yield datetime.date.fromordinal(days[i]), self.usernames[caregivers[i]]
+
+    def vaccines(self):
+        names = self.column("vaccines", "name")
+        doses = self.column("vaccines", "doses")
+        return [(self.vaccine_names[names[i]], doses[i]) for i in range(len(names))]
+
+    # Read the three tables from the database and write them to path (via a temp file renamed into place)
+    @staticmethod
+    def export(path):
+        usernames = {}
+        vaccine_names = {}
+        data = {table + "." + name: array("i") for table, names in Snapshot.COLUMNS.items() for name in names}
+
+        def username_index(username):
+            return usernames.setdefault(username, len(usernames))
+
+        def vaccine_index(vaccine_name):
+            return vaccine_names.setdefault(vaccine_name, len(vaccine_names))
+
+        today = datetime.date.today()
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        try:
+            cursor = conn.cursor()
+            interval_slots = set((slot[0], slot[1]) for slot in AvailabilityInterval.open_slots(
+                conn, today, today + datetime.timedelta(days=Snapshot.INTERVAL_HORIZON_DAYS)))
+            Queries.execute(cursor, "availability.all")
+            availabilities = sorted(interval_slots.union((row[0], row[1]) for row in cursor))
+            for day, caregiver in availabilities:
+                data["availability.day"].append(day.toordinal())
+                data["availability.caregiver"].append(username_index(caregiver))
+
+            Queries.execute(cursor, "vaccine.all")
+            for name, doses in cursor:
+                data["vaccines.name"].append(vaccine_index(name))
+                data["vaccines.doses"].append(doses)
+
+            Queries.execute(cursor, "appointment.all")
+            for a_id, day, patient, caregiver, vaccine in cursor:
+                data["appointments.a_id"].append(a_id)
+                data["appointments.day"].append(day.toordinal())
+                data["appointments.patient"].append(username_index(patient))
+                data["appointments.caregiver"].append(username_index(caregiver))
+                data["appointments.vaccine"].append(vaccine_index(vaccine))
+        finally:
+            cm.close_connection()
+
+        Snapshot._write(path, data, sorted(usernames, key=usernames.get),
+                        sorted(vaccine_names, key=vaccine_names.get))
+        return {table: len(data[table + "." + names[0]]) for table, names in Snapshot.COLUMNS.items()}
+
+    @staticmethod
+    def _write(path, data, usernames, vaccine_names):
+        # Column offsets are relative to the start of the data section, which follows the header
+        offsets = {}
+        offset = 0
+        for name, column in data.items():
+            offsets[name] = [offset, len(column)]
+            offset += Snapshot._aligned(len(column) * 4)
+        header = json.dumps({
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "byteorder": sys.byteorder,
+            "usernames": usernames,
+            "vaccine_names": vaccine_names,
+            "columns": offsets,
+        }).encode("utf-8")
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(Snapshot.MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(b"\0" * (Snapshot._aligned(f.tell()) - f.tell()))
+            for column in data.values():
+                column.tofile(f)
+                f.write(b"\0" * (Snapshot._aligned(len(column) * 4) - len(column) * 4))
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _aligned(size):
+        return (size + 7) // 8 * 8
@@ -0,0 +1,80 @@
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+from model.Vaccine import Vaccine
+
+
+class UnitOfWork:
+    '''
+    One connection and one transaction for everything a command reads and writes. Loaded models are kept in an
+    identity map, so asking for the same vaccine twice returns the same object without another query. Model changes
+    are collected and written by commit() together with any statements the command ran on uow.conn directly.
+    Closing it (or leaving the with-block) without committing rolls everything back.
+    '''
+
+    def __init__(self, site=None):
+        self.cm = ConnectionManager(site=site)  # the active site's database unless another site is given
+        self.conn = None
+        self.identity_map = {}
+        self.new = []
+        self.dirty = []
+        self.all_vaccines_loaded = False
+
+    def begin(self):
+        self.conn = self.cm.create_connection()
+        return self.conn
+
+    def close(self):
+        self.cm.close_connection()  # closing without a commit rolls back
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def get_vaccine(self, name):
+        key = (Vaccine, name.lower())
+        if key not in self.identity_map and not self.all_vaccines_loaded:
+            vaccine = Vaccine(name, None).get(self.conn)
+            if vaccine is not None:
+                self.identity_map[key] = vaccine
+        return self.identity_map.get(key)
+
+    # Load every vaccine with one query and hydrate them in one batch
+    def load_vaccines(self):
+        if not self.all_vaccines_loaded:
+            cursor = self.conn.cursor()
+            Queries.execute(cursor, "vaccine.all")
+            for vaccine in Vaccine.from_rows(cursor.fetchall()):
+                self.identity_map.setdefault((Vaccine, vaccine.vaccine_name.lower()), vaccine)
+            self.all_vaccines_loaded = True
+        return sorted((obj for key, obj in self.identity_map.items() if key[0] is Vaccine),
+                      key=lambda vaccine: vaccine.vaccine_name)
+
+    def add_vaccine(self, vaccine):
+        if vaccine.available_doses is None or vaccine.available_doses <= 0:
+            raise ValueError("Argument cannot be negative!")
+        self.identity_map[(Vaccine, vaccine.vaccine_name.lower())] = vaccine
+        self.new.append(vaccine)
+
+    def change_doses(self, vaccine, change):
+        if vaccine.available_doses + change < 0:
+            raise ValueError("Not enough available doses!")
+        vaccine.available_doses += change
+        if vaccine in self.new:  # not inserted yet; the insert will carry the new total
+            return
+        vaccine.pending_change += change
+        if vaccine not in self.dirty:
+            self.dirty.append(vaccine)
+
+    # Flush every collected change and commit the whole transaction
+    def commit(self):
+        for vaccine in self.new:
+            vaccine.save_to_db(self.conn)
+        for vaccine in self.dirty:
+            vaccine.flush(self.conn)
+        self.conn.commit()
+        self.new = []
+        self.dirty = []
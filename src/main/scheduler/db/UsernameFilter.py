@@ -0,0 +1,44 @@
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+from util.BloomFilter import BloomFilter
+
+
+class UsernameFilter:
+    '''
+    In-process Bloom filters of the existing usernames for each role, built once at startup. A username the filter
+    has never seen is definitely new, so create_patient / create_caregiver can skip the SELECT pre-check and go
+    straight to the insert; the primary key still rejects any duplicate. Until the filters are built every username
+    counts as possibly taken.
+    '''
+    ROLES = ("patient", "caregiver")
+    HEADROOM = 2  # size for twice the current table so signups made while running keep the false-positive rate low
+    MIN_ITEMS = 1024
+
+    def __init__(self):
+        self.filters = {}
+
+    def rebuild(self):
+        cm = ConnectionManager(primary=True)
+        conn = cm.create_connection()
+        try:
+            cursor = conn.cursor()
+            filters = {}
+            for role in UsernameFilter.ROLES:
+                count = Queries.execute(cursor, role + ".count").fetchone()[0]
+                bloom = BloomFilter(max(count * UsernameFilter.HEADROOM, UsernameFilter.MIN_ITEMS))
+                Queries.execute(cursor, role + ".all_usernames")
+                for row in cursor:
+                    bloom.add(row[0].lower())
+                filters[role] = bloom
+            self.filters = filters
+        finally:
+            cm.close_connection()
+
+    def might_exist(self, role, username):
+        if role not in self.filters:
+            return True
+        return self.filters[role].might_contain(username.lower())
+
+    def add(self, role, username):
+        if role in self.filters:
+            self.filters[role].add(username.lower())
@@ -0,0 +1,134 @@
+import datetime
+import sys
+sys.path.append("../db/*")
+from db.AvailabilitySummary import AvailabilitySummary
+from db.ConflictError import ConflictError
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+from db.Journal import Journal
+
+
+class AvailabilityInterval:
+    RECURRENCES = ("daily", "weekdays", "weekly")
+    # first_open_slot expands intervals this many days at a time, so it stops reading once a slot is found
+    SEARCH_CHUNK_DAYS = 31
+
+    def __init__(self, username, start_date, end_date, recurrence="daily", capacity=1, i_id=None):
+        self.i_id = i_id
+        self.username = username
+        self.start_date = start_date
+        self.end_date = end_date
+        self.recurrence = recurrence
+        self.capacity = capacity
+
+    @staticmethod
+    def from_row(row):
+        return AvailabilityInterval(row[1], row[2], row[3], row[4], row[5], i_id=row[0])
+
+    def occurs_on(self, day):
+        if day < self.start_date or day > self.end_date:
+            return False
+        if self.recurrence == "weekdays":
+            return day.weekday() < 5
+        if self.recurrence == "weekly":
+            return day.weekday() == self.start_date.weekday()
+        return True
+
+    def save_to_db(self):
+        if self.recurrence not in AvailabilityInterval.RECURRENCES:
+            raise ValueError("Recurrence must be one of: " + ", ".join(AvailabilityInterval.RECURRENCES))
+        if self.end_date < self.start_date:
+            raise ValueError("End date cannot be before the start date!")
+        if self.capacity <= 0:
+            raise ValueError("Capacity must be at least 1!")
+
+        with ConnectionManager.transaction() as conn:
+            Queries.execute(conn.cursor(), "interval.insert", (self.username, self.start_date, self.end_date,
+                                                               self.recurrence, self.capacity))
+            Journal.record(conn, Journal.INTERVAL_ADDED, day=self.start_date, c_username=self.username,
+                           quantity=self.capacity)
+            AvailabilitySummary.adjust_days(conn, self.days(), self.capacity)
+
+    # Every day this interval occurs on
+    def days(self):
+        day = self.start_date
+        while day <= self.end_date:
+            if self.occurs_on(day):
+                yield day
+            day += datetime.timedelta(days=1)
+
+    # Return a generator of (day, username, i_id, open_slots) for every open interval slot in [start, end], ordered
+    # by day and then username. Only the intervals overlapping the window and the booked days inside it are read
+    # (up front, so the connection is free again when this returns); the individual days are generated on demand.
+    @staticmethod
+    def open_slots(conn, start, end):
+        cursor = conn.cursor()
+        intervals = [AvailabilityInterval.from_row(row)
+                     for row in Queries.execute(cursor, "interval.overlapping", (start, end)).fetchall()]
+        booked = {}
+        if len(intervals) > 0:
+            booked = {(row[0], row[1]): row[2]
+                      for row in Queries.execute(cursor, "interval.exceptions", (start, end)).fetchall()}
+        return AvailabilityInterval._expand(intervals, booked, start, end)
+
+    # The first open interval slot in [start, end] as (day, username, i_id, open_slots), or None. The window is
+    # expanded in chunks, each reading only the intervals and booked days inside it, and never past the last
+    # interval's end date.
+    @staticmethod
+    def first_open_slot(conn, start, end):
+        last_end = AvailabilityInterval.last_end_date(conn)
+        if last_end is None:
+            return None
+        end = min(end, last_end)
+        while start <= end:
+            chunk_end = min(end, start + datetime.timedelta(days=AvailabilityInterval.SEARCH_CHUNK_DAYS - 1))
+            slot = next(AvailabilityInterval.open_slots(conn, start, chunk_end), None)
+            if slot is not None:
+                return slot
+            start = chunk_end + datetime.timedelta(days=1)
+        return None
+
+    @staticmethod
+    def _expand(intervals, booked, start, end):
+        if len(intervals) == 0:
+            return
+        day = max(start, min(interval.start_date for interval in intervals))
+        end = min(end, max(interval.end_date for interval in intervals))
+        while day <= end:
+            for interval in intervals:  # already sorted by username
+                if interval.occurs_on(day):
+                    open_count = interval.capacity - booked.get((interval.i_id, day), 0)
+                    if open_count > 0:
+                        yield day, interval.username, interval.i_id, open_count
+            day += datetime.timedelta(days=1)
+
+    # Claim one slot of an interval on the given day inside the caller's transaction
+    @staticmethod
+    def book(conn, i_id, username, day):
+        cursor = conn.cursor()
+        Queries.execute(cursor, "interval.book", (i_id, day))
+        if cursor.rowcount == 0:
+            Queries.execute(cursor, "interval.book_first", (i_id, day))
+        if cursor.rowcount == 0:
+            # A concurrent first booking of the day won the insert; its row now exists, so book against it
+            Queries.execute(cursor, "interval.book", (i_id, day))
+            if cursor.rowcount == 0:
+                raise ConflictError("That caregiver is no longer available on this date")
+        Journal.record(conn, Journal.INTERVAL_BOOKED, day=day, c_username=username)
+        AvailabilitySummary.adjust(conn, day, -1)
+
+    # Give back one booked interval slot for the caregiver on the given day; returns False if none was booked
+    @staticmethod
+    def release(conn, username, day):
+        cursor = conn.cursor()
+        Queries.execute(cursor, "interval.release", (username, day))
+        if cursor.rowcount == 0:
+            return False
+        Journal.record(conn, Journal.INTERVAL_RELEASED, day=day, c_username=username)
+        AvailabilitySummary.adjust(conn, day, 1)
+        return True
+
+    @staticmethod
+    def last_end_date(conn):
+        cursor = conn.cursor()
+        return Queries.execute(cursor, "interval.max_end_date").fetchone()[0]
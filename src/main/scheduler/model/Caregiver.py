@@ -3,10 +3,15 @@ sys.path.append("../util/*")
 sys.path.append("../db/*")
 from util.Util import Util
 from db.ConnectionManager import ConnectionManager
+from db import Queries
+from db.AvailabilitySummary import AvailabilitySummary
+from db.Journal import Journal
 import pymssql
 
 
 class Caregiver:
+    __slots__ = ("username", "password", "salt", "hash")
+
     def __init__(self, username, password=None, salt=None, hash=None):
         self.username = username
         self.password = password
@@ -15,13 +20,12 @@ class Caregiver:
 
     # getters
     def get(self):
-        cm = ConnectionManager()
+        cm = ConnectionManager(primary=True)
         conn = cm.create_connection()
         cursor = conn.cursor(as_dict=True)
 
-        get_caregiver_details = "SELECT Salt, Hash FROM Caregivers WHERE Username = %s"
         try:
-            cursor.execute(get_caregiver_details, self.username)
+            Queries.execute(cursor, "caregiver.get_credentials", self.username)
             for row in cursor:
                 curr_salt = row['Salt']
                 curr_hash = row['Hash']
@@ -52,13 +56,12 @@ class Caregiver:
         return self.hash
 
     def save_to_db(self):
-        cm = ConnectionManager()
+        cm = ConnectionManager(primary=True)
         conn = cm.create_connection()
         cursor = conn.cursor()
 
-        add_caregivers = "INSERT INTO Caregivers VALUES (%s, %s, %s)"
         try:
-            cursor.execute(add_caregivers, (self.username, self.salt, self.hash))
+            Queries.execute(cursor, "caregiver.insert", (self.username, self.salt, self.hash))
             # you must call commit() to persist your data if you don't set autocommit to True
             conn.commit()
         except pymssql.Error:
@@ -67,18 +70,8 @@ class Caregiver:
             cm.close_connection()
 
     # Insert availability with parameter date d
-    def upload_availability(self, d):
-        cm = ConnectionManager()
-        conn = cm.create_connection()
-        cursor = conn.cursor()
-
-        add_availability = "INSERT INTO Availabilities VALUES (%s , %s)"
-        try:
-            cursor.execute(add_availability, (d, self.username))
-            # you must call commit() to persist your data if you don't set autocommit to True
-            conn.commit()
-        except pymssql.Error:
-            # print("Error occurred when updating caregiver availability")
-            raise
-        finally:
-            cm.close_connection()
+    def upload_availability(self, d, conn=None):
+        with ConnectionManager.transaction(conn) as conn:
+            Queries.execute(conn.cursor(), "availability.insert", (d, self.username))
+            Journal.record(conn, Journal.AVAILABILITY_ADDED, day=d, c_username=self.username)
+            AvailabilitySummary.adjust(conn, d, 1)
@@ -0,0 +1,72 @@
+import sys
+sys.path.append("../db/*")
+from db.AvailabilitySummary import AvailabilitySummary
+from db import Queries
+from db.Journal import Journal
+from model.AvailabilityInterval import AvailabilityInterval
+
+
+class Hold:
+    '''
+    A patient's short claim on a caregiver slot and one dose. Placing a hold takes the slot and the dose right away
+    (in the caller's transaction, like a reservation), so nobody else can book them, but no locks are kept while the
+    patient decides. Confirming deletes the hold and creates the appointment; a hold that runs past its expiry is
+    handed back by the HoldReaper.
+    '''
+    __slots__ = ("h_id", "p_username", "c_username", "day", "vaccine_name", "i_id", "expires_at")
+    TTL_SECONDS = 300
+
+    def __init__(self, p_username, c_username, day, vaccine_name, i_id=None, h_id=None, expires_at=None):
+        self.h_id = h_id
+        self.p_username = p_username
+        self.c_username = c_username
+        self.day = day
+        self.vaccine_name = vaccine_name
+        self.i_id = i_id  # availability interval the slot came from, or None for a single-day availability
+        self.expires_at = expires_at  # UTC
+
+    @staticmethod
+    def from_row(row):
+        return Hold(row[1], row[2], row[3], row[4], i_id=row[5], h_id=row[0], expires_at=row[6])
+
+    # Insert the hold on the caller's connection; the slot and the dose must already be claimed in the same transaction
+    def save_to_db(self, conn, ttl_seconds=TTL_SECONDS):
+        if ttl_seconds <= 0:
+            raise ValueError("Hold time must be positive!")
+        cursor = conn.cursor()
+        self.h_id, self.expires_at = Queries.execute(cursor, "hold.insert", (
+            self.p_username, self.c_username, self.day, self.vaccine_name, self.i_id, ttl_seconds)).fetchone()
+        Journal.record(conn, Journal.HOLD_PLACED, day=self.day, c_username=self.c_username,
+                       p_username=self.p_username, vaccine_name=self.vaccine_name, quantity=1)
+        return self
+
+    # Remove the patient's hold if it has not expired and return it, or None; the caller turns it into an appointment
+    @staticmethod
+    def take(conn, h_id, p_username):
+        row = Queries.execute(conn.cursor(), "hold.take", (h_id, p_username)).fetchone()
+        return None if row is None else Hold.from_row(row)
+
+    # Remove up to batch_size expired holds and return them; the caller gives them back with release()
+    @staticmethod
+    def take_expired(conn, batch_size):
+        cursor = conn.cursor()
+        return [Hold.from_row(row) for row in Queries.execute(cursor, "hold.take_expired", batch_size).fetchall()]
+
+    # Return the slots and doses of taken holds inside the caller's transaction, one dose update per vaccine
+    @staticmethod
+    def release(conn, holds):
+        cursor = conn.cursor()
+        doses = {}
+        for hold in holds:
+            doses[hold.vaccine_name] = doses.get(hold.vaccine_name, 0) + 1
+            if hold.i_id is None or not AvailabilityInterval.release(conn, hold.c_username, hold.day):
+                # the caregiver may have uploaded the same day again meanwhile; then the slot is already there
+                Queries.execute(cursor, "availability.insert_missing", (hold.day, hold.c_username))
+                if cursor.rowcount > 0:
+                    Journal.record(conn, Journal.AVAILABILITY_ADDED, day=hold.day, c_username=hold.c_username)
+                    AvailabilitySummary.adjust(conn, hold.day, 1)
+            Journal.record(conn, Journal.HOLD_EXPIRED, day=hold.day, c_username=hold.c_username,
+                           p_username=hold.p_username, vaccine_name=hold.vaccine_name, quantity=1)
+        for vaccine_name, count in sorted(doses.items()):
+            Queries.execute(cursor, "vaccine.change_doses", (count, vaccine_name))
+            Journal.record(conn, Journal.DOSES_CHANGED, vaccine_name=vaccine_name, quantity=count)
@@ -3,10 +3,13 @@ from util.Util import Util
 sys.path.append("../util/*")
 sys.path.append("../db/*")
 from db.ConnectionManager import ConnectionManager
+from db import Queries
 import pymssql
 
 
 class Patient:
+    __slots__ = ("username", "password", "salt", "hash")
+
     def __init__(self, username, password=None, salt=None, hash=None):
         self.username = username
         self.password = password
@@ -14,13 +17,12 @@ class Patient:
         self.hash = hash
 
     def get(self):
-        cm = ConnectionManager()
+        cm = ConnectionManager(primary=True)
         conn = cm.create_connection()
         cursor = conn.cursor(as_dict=True)
 
-        get_patient_details = "SELECT Salt, Hash FROM Patients WHERE Username = %s"
         try:
-            cursor.execute(get_patient_details, self.username)
+            Queries.execute(cursor, "patient.get_credentials", self.username)
             for row in cursor:
                 curr_salt = row['Salt']
                 curr_hash = row['Hash']
@@ -51,13 +53,12 @@ class Patient:
         return self.hash
 
     def save_to_db(self):
-        cm = ConnectionManager()
+        cm = ConnectionManager(primary=True)
         conn = cm.create_connection()
         cursor = conn.cursor()
 
-        add_patient = "INSERT INTO Patients VALUES (%s, %s, %s)"
         try:
-            cursor.execute(add_patient, (self.username, self.salt, self.hash))
+            Queries.execute(cursor, "patient.insert", (self.username, self.salt, self.hash))
             # you must call commit() to persist your data if you don't set autocommit to True
             conn.commit()
         except pymssql.Error:
@@ -1,31 +1,45 @@
 import sys
 sys.path.append("../db/*")
+from db.ConflictError import ConflictError
 from db.ConnectionManager import ConnectionManager
+from db import Queries
+from db.Journal import Journal
 import pymssql
 
 
 class Vaccine:
+    __slots__ = ("vaccine_name", "available_doses", "pending_change")
+
     def __init__(self, vaccine_name, available_doses):
         self.vaccine_name = vaccine_name
         self.available_doses = available_doses
+        self.pending_change = 0  # dose change made through a unit of work and not yet flushed
+
+    # Build vaccines from (Name, Doses) rows in one pass
+    @staticmethod
+    def from_rows(rows):
+        return [Vaccine(row[0], row[1]) for row in rows]
 
     # getters
-    def get(self):
-        cm = ConnectionManager()
-        conn = cm.create_connection()
+    def get(self, conn=None):
+        cm = None
+        if conn is None:
+            cm = ConnectionManager()
+            conn = cm.create_connection()
         cursor = conn.cursor()
 
-        get_vaccine = "SELECT Name, Doses FROM Vaccines WHERE Name = %s"
         try:
-            cursor.execute(get_vaccine, self.vaccine_name)
+            Queries.execute(cursor, "vaccine.get", self.vaccine_name)
             for row in cursor:
+                self.vaccine_name = row[0]  # names match case-insensitively; keep the stored spelling
                 self.available_doses = row[1]
                 return self
         except pymssql.Error:
             # print("Error occurred when getting Vaccine")
             raise
         finally:
-            cm.close_connection()
+            if cm is not None:
+                cm.close_connection()
         return None
 
     def get_vaccine_name(self):
@@ -34,66 +48,27 @@ class Vaccine:
     def get_available_doses(self):
         return self.available_doses
 
-    def save_to_db(self):
+    # Pass a connection to make this part of the caller's transaction; otherwise it is committed on its own
+    def save_to_db(self, conn=None):
         if self.available_doses is None or self.available_doses <= 0:
             raise ValueError("Argument cannot be negative!")
 
-        cm = ConnectionManager()
-        conn = cm.create_connection()
-        cursor = conn.cursor()
-
-        add_doses = "INSERT INTO VACCINES VALUES (%s, %d)"
-        try:
-            cursor.execute(add_doses, (self.vaccine_name, self.available_doses))
-            # you must call commit() to persist your data if you don't set autocommit to True
-            conn.commit()
-        except pymssql.Error:
-            # print("Error occurred when insert Vaccines")
-            raise
-        finally:
-            cm.close_connection()
-
-    # Increment the available doses
-    def increase_available_doses(self, num):
-        if num <= 0:
-            raise ValueError("Argument cannot be negative!")
-        self.available_doses += num
+        with ConnectionManager.transaction(conn) as conn:
+            Queries.execute(conn.cursor(), "vaccine.insert", (self.vaccine_name, self.available_doses))
+            Journal.record(conn, Journal.DOSES_CHANGED, vaccine_name=self.vaccine_name,
+                           quantity=self.available_doses)
 
-        cm = ConnectionManager()
-        conn = cm.create_connection()
+    # Write the dose change collected by a unit of work as one relative update; the update only applies if the stock
+    # stays non-negative, so concurrent bookings cannot oversell
+    def flush(self, conn):
+        if self.pending_change == 0:
+            return
         cursor = conn.cursor()
-
-        update_vaccine_availability = "UPDATE vaccines SET Doses = %d WHERE name = %s"
-        try:
-            cursor.execute(update_vaccine_availability, (self.available_doses, self.vaccine_name))
-            # you must call commit() to persist your data if you don't set autocommit to True
-            conn.commit()
-        except pymssql.Error:
-            # print("Error occurred when updating vaccine availability")
-            raise
-        finally:
-            cm.close_connection()
-
-    # Decrement the available doses
-    def decrease_available_doses(self, num):
-        if self.available_doses - num < 0:
-            ValueError("Not enough available doses!")
-        self.available_doses -= num
-
-        cm = ConnectionManager()
-        conn = cm.create_connection()
-        cursor = conn.cursor()
-
-        update_vaccine_availability = "UPDATE vaccines SET Doses = %d WHERE name = %s"
-        try:
-            cursor.execute(update_vaccine_availability, (self.available_doses, self.vaccine_name))
-            # you must call commit() to persist your data if you don't set autocommit to True
-            conn.commit()
-        except pymssql.Error:
-            # print("Error occurred when updating vaccine availability")
-            raise
-        finally:
-            cm.close_connection()
+        Queries.execute(cursor, "vaccine.change_doses", (self.pending_change, self.vaccine_name))
+        if cursor.rowcount == 0:  # another booking took the last doses after this one read the stock
+            raise ConflictError("Not enough available doses left for " + self.vaccine_name)
+        Journal.record(conn, Journal.DOSES_CHANGED, vaccine_name=self.vaccine_name, quantity=self.pending_change)
+        self.pending_change = 0
 
     def __str__(self):
         return f"(Vaccine Name: {self.vaccine_name}, Available Doses: {self.available_doses})"
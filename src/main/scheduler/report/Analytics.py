@@ -0,0 +1,119 @@
+import datetime
+import numpy as np
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+from model.AvailabilityInterval import AvailabilityInterval
+
+
+class Analytics:
+    # Days of history used to estimate the daily consumption rate
+    TRAILING_DAYS = 28
+
+    def __init__(self, today=None):
+        self.today = today or datetime.date.today()
+        self.vaccine_names = []
+        self.doses = np.zeros(0, dtype=np.int64)
+        self.first_day = self.today.toordinal()
+        # consumption[v, d] = appointments for vaccine v on day first_day + d (archived history included)
+        self.consumption = np.zeros((0, 0), dtype=np.int64)
+
+    # Pull per-day appointment counts and vaccine stock in bulk and build the grid from them
+    def load(self):
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        try:
+            cursor = conn.cursor()
+            Queries.execute(cursor, "vaccine.all")
+            vaccines = cursor.fetchall()
+            Queries.execute(cursor, "report.daily_appointments")
+            appointments = cursor.fetchall()
+        finally:
+            cm.close_connection()
+        return self.build(vaccines, appointments)
+
+    # Lay out (Name, Doses) vaccine rows and (date, vaccine, count) appointment rows as the vaccine x day grid
+    def build(self, vaccines, appointments):
+        self.vaccine_names = [row[0] for row in vaccines]
+        self.doses = np.array([row[1] for row in vaccines], dtype=np.int64)
+        # Names match case-insensitively in the database, and appointments keep the spelling the patient typed
+        index = {name.lower(): i for i, name in enumerate(self.vaccine_names)}
+
+        days = np.fromiter((row[0].toordinal() for row in appointments), dtype=np.int64, count=len(appointments))
+        vaccine_index = np.fromiter((index.get(row[1].lower(), -1) for row in appointments), dtype=np.int64,
+                                    count=len(appointments))
+        counts = np.fromiter((row[2] for row in appointments), dtype=np.int64, count=len(appointments))
+        known = vaccine_index >= 0  # the foreign key makes this all rows; kept so a stray name cannot break the grid
+
+        self.first_day = min(int(days.min()), self.today.toordinal()) if len(days) > 0 else self.today.toordinal()
+        last_day = max(int(days.max()), self.today.toordinal()) if len(days) > 0 else self.today.toordinal()
+        self.consumption = np.zeros((len(self.vaccine_names), last_day - self.first_day + 1), dtype=np.int64)
+        np.add.at(self.consumption, (vaccine_index[known], days[known] - self.first_day), counts[known])
+        return self
+
+    # Mean doses used per day for each vaccine over the trailing window ending yesterday
+    def daily_consumption(self, trailing_days=TRAILING_DAYS):
+        end = self.today.toordinal() - self.first_day
+        start = max(end - trailing_days, 0)
+        if end <= start:
+            return np.zeros(len(self.vaccine_names))
+        return self.consumption[:, start:end].sum(axis=1) / trailing_days
+
+    # Rows of (vaccine, doses left, doses per day, projected stock-out date or None if not being used)
+    def stock_out_forecast(self, trailing_days=TRAILING_DAYS):
+        rates = self.daily_consumption(trailing_days)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_left = np.where(rates > 0, np.floor(self.doses / rates), np.nan)
+        rows = []
+        for i, name in enumerate(self.vaccine_names):
+            stock_out = None
+            if self.doses[i] <= 0:
+                stock_out = self.today
+            elif not np.isnan(days_left[i]):
+                stock_out = self.today + datetime.timedelta(days=int(days_left[i]))
+            rows.append((name, int(self.doses[i]), round(float(rates[i]), 2), stock_out))
+        return rows
+
+    # Rows of (date, booked, open slots, expected demand, gap) for every date in [start, end]. Expected demand is the
+    # trailing average of total daily appointments; a negative gap means the date is under-staffed.
+    def staffing_gaps(self, start, end, trailing_days=TRAILING_DAYS):
+        length = (end - start).days + 1
+        if length <= 0:
+            raise ValueError("End date cannot be before the start date!")
+        offset = start.toordinal()
+        open_slots = np.zeros(length, dtype=np.int64)
+
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        try:
+            cursor = conn.cursor()
+            Queries.execute(cursor, "analytics.open_slots_per_day", (start, end))
+            rows = cursor.fetchall()
+            for day, _, _, count in AvailabilityInterval.open_slots(conn, start, end):
+                open_slots[day.toordinal() - offset] += count
+        finally:
+            cm.close_connection()
+        if len(rows) > 0:
+            slot_days = np.array([row[0].toordinal() for row in rows], dtype=np.int64) - offset
+            np.add.at(open_slots, slot_days, np.array([row[1] for row in rows], dtype=np.int64))
+        return self.gaps(start, open_slots, trailing_days)
+
+    # The staffing gap rows for open_slots[i] open slots on start + i days
+    def gaps(self, start, open_slots, trailing_days=TRAILING_DAYS):
+        length = len(open_slots)
+        offset = start.toordinal()
+        end = start + datetime.timedelta(days=length - 1)
+
+        # Appointments already booked per date, taken from the loaded grid
+        booked = np.zeros(length, dtype=np.int64)
+        totals = self.consumption.sum(axis=0)
+        grid_start = max(offset, self.first_day)
+        grid_end = min(end.toordinal(), self.first_day + len(totals) - 1)
+        if grid_start <= grid_end:
+            booked[grid_start - offset:grid_end - offset + 1] = totals[grid_start - self.first_day:
+                                                                       grid_end - self.first_day + 1]
+
+        expected = float(self.daily_consumption(trailing_days).sum())
+        gaps = open_slots - np.maximum(expected - booked, 0)
+        dates = [start + datetime.timedelta(days=i) for i in range(length)]
+        return list(zip(dates, booked.tolist(), open_slots.tolist(), [round(expected, 2)] * length,
+                        np.round(gaps, 2).tolist()))
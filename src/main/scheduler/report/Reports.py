@@ -0,0 +1,45 @@
+import csv
+import os
+import sys
+sys.path.append("../db/*")
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+import pymssql
+
+
+class Reports:
+    # report name -> registered aggregate query; all grouping happens on the server
+    REPORTS = {
+        "daily_appointments": "report.daily_appointments",
+        "caregiver_utilization": "report.caregiver_utilization",
+        "dose_burndown": "report.dose_burndown",
+    }
+
+    @staticmethod
+    def export(report_name, path):
+        # Stream the aggregated rows straight from the cursor into a CSV file. The file is written next to its
+        # destination and renamed into place at the end, so a reader never sees a half-written report.
+        if report_name not in Reports.REPORTS:
+            raise ValueError("Unknown report: " + report_name)
+
+        cm = ConnectionManager()
+        conn = cm.create_connection()
+        cursor = conn.cursor()
+        temp_path = path + ".tmp"
+        count = 0
+        try:
+            Queries.execute(cursor, Reports.REPORTS[report_name])
+            with open(temp_path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow([column[0] for column in cursor.description])
+                for row in cursor:
+                    writer.writerow(row)
+                    count += 1
+            os.replace(temp_path, path)
+        except pymssql.Error:
+            raise
+        finally:
+            cm.close_connection()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return count
@@ -0,0 +1,25 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    # A set membership test with no false negatives: might_contain() is False only for values never added
+    def __init__(self, expected_items, false_positive_rate=0.01):
+        expected_items = max(expected_items, 1)
+        self.size = max(int(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / expected_items * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: k positions derived from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
@@ -0,0 +1,134 @@
+import math
+import time
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+
+
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    # Take one token; returns 0 if one was available, otherwise the seconds until the next token
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return math.ceil((1 - self.tokens) / self.refill_per_second)
+
+    # A bucket that has refilled completely behaves exactly like a new one, so it can be dropped
+    def is_full(self, now):
+        return self.tokens + (now - self.updated) * self.refill_per_second >= self.capacity
+
+
+class LoginThrottle:
+    '''
+    Rejects login attempts before any password hashing happens. Every attempt takes a token from a bucket for its
+    (role, username, client) key and from one for the client as a whole, so neither one account nor one client can
+    force a burst of PBKDF2 computations. Repeated failures for a key lock it out for an exponentially growing time.
+    With persist=True the failure counts and lockouts live in the LoginThrottle table so every process shares them,
+    and are forgotten there after the same time; the token buckets are always per process.
+    '''
+    USER_CAPACITY = 5
+    USER_REFILL_PER_SECOND = 1 / 30
+    CLIENT_CAPACITY = 20
+    CLIENT_REFILL_PER_SECOND = 1 / 3
+    FREE_FAILURES = 3  # failures allowed before the first lockout
+    BASE_LOCKOUT_SECONDS = 30
+    MAX_LOCKOUT_SECONDS = 3600
+    FAILURE_MEMORY_SECONDS = 3600  # failure counts are forgotten this long after the last failure
+    SWEEP_SECONDS = 60  # how often idle buckets, old failure counts and expired lockouts are dropped
+    SWEEP_BATCH_SIZE = 500  # LoginThrottle rows deleted per sweep, so a sweep never holds locks for long
+
+    def __init__(self, persist=False):
+        self.persist = persist
+        self.buckets = {}
+        self.failures = {}  # key -> (failures, time of the last failure)
+        self.locked_until = {}
+        self.last_sweep = time.monotonic()
+
+    @staticmethod
+    def key(role, username, client):
+        return "{}:{}@{}".format(role, username, client)
+
+    # Seconds the caller has to wait before this attempt is allowed; 0 means go ahead
+    def check(self, role, username, client):
+        self._sweep()
+        key = LoginThrottle.key(role, username, client)
+        wait = self._lockout_seconds(key)
+        if wait > 0:
+            return wait
+        user_bucket = self._bucket(key, LoginThrottle.USER_CAPACITY, LoginThrottle.USER_REFILL_PER_SECOND)
+        client_bucket = self._bucket(client, LoginThrottle.CLIENT_CAPACITY, LoginThrottle.CLIENT_REFILL_PER_SECOND)
+        return max(user_bucket.take(), client_bucket.take())
+
+    def record_failure(self, role, username, client):
+        key = LoginThrottle.key(role, username, client)
+        if self.persist:
+            with ConnectionManager.transaction(primary=True) as conn:
+                cursor = conn.cursor()
+                failures = Queries.execute(cursor, "throttle.record_failure",
+                                           (key, LoginThrottle.FAILURE_MEMORY_SECONDS)).fetchone()[0]
+                seconds = LoginThrottle._lockout_for(failures)
+                if seconds > 0:
+                    Queries.execute(cursor, "throttle.lock", (seconds, key))
+            return
+        now = time.monotonic()
+        failures = self.failures.get(key, (0, now))[0] + 1
+        self.failures[key] = (failures, now)
+        seconds = LoginThrottle._lockout_for(failures)
+        if seconds > 0:
+            self.locked_until[key] = now + seconds
+
+    def record_success(self, role, username, client):
+        key = LoginThrottle.key(role, username, client)
+        self.failures.pop(key, None)
+        self.locked_until.pop(key, None)
+        if self.persist:
+            with ConnectionManager.transaction(primary=True) as conn:
+                Queries.execute(conn.cursor(), "throttle.reset", key)
+
+    # Drop state that no longer changes any decision, so a client cycling through usernames cannot grow the dicts
+    # (or the LoginThrottle table) without bound
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self.last_sweep < LoginThrottle.SWEEP_SECONDS:
+            return
+        self.last_sweep = now
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if not bucket.is_full(now)}
+        self.locked_until = {key: until for key, until in self.locked_until.items() if until > now}
+        self.failures = {key: failure for key, failure in self.failures.items()
+                         if key in self.locked_until or now - failure[1] < LoginThrottle.FAILURE_MEMORY_SECONDS}
+        if self.persist:
+            with ConnectionManager.transaction(primary=True) as conn:
+                Queries.execute(conn.cursor(), "throttle.sweep",
+                                (LoginThrottle.SWEEP_BATCH_SIZE, LoginThrottle.FAILURE_MEMORY_SECONDS))
+
+    def _bucket(self, key, capacity, refill_per_second):
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(capacity, refill_per_second)
+        return self.buckets[key]
+
+    def _lockout_seconds(self, key):
+        if self.persist:
+            cm = ConnectionManager(primary=True)
+            conn = cm.create_connection()
+            try:
+                row = Queries.execute(conn.cursor(), "throttle.lockout_seconds", key).fetchone()
+            finally:
+                cm.close_connection()
+            return 0 if row is None else max(row[0], 0)
+        remaining = self.locked_until.get(key, 0) - time.monotonic()
+        return math.ceil(remaining) if remaining > 0 else 0
+
+    @staticmethod
+    def _lockout_for(failures):
+        if failures < LoginThrottle.FREE_FAILURES:
+            return 0
+        seconds = LoginThrottle.BASE_LOCKOUT_SECONDS * 2 ** (failures - LoginThrottle.FREE_FAILURES)
+        return min(seconds, LoginThrottle.MAX_LOCKOUT_SECONDS)
@@ -0,0 +1,57 @@
+import cProfile
+import datetime
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+
+class Profiler:
+    '''
+    Runs a command under cProfile and tracemalloc. For every profiled command it writes <time>-<command>.pstats (open
+    with pstats or snakeviz) and <time>-<command>.tracemalloc (load with tracemalloc.Snapshot.load) into the
+    directory, then prints the wall time, peak traced memory, the slowest functions by cumulative time and the lines
+    that allocated the most memory.
+    '''
+    TOP = 10
+    TRACEBACK_FRAMES = 5
+
+    def __init__(self, directory, top=TOP):
+        self.directory = directory
+        self.top = top
+
+    def run(self, label, func, *args):
+        os.makedirs(self.directory, exist_ok=True)
+        label = "".join(c if c.isalnum() or c == "_" else "_" for c in label)  # label is used in file names
+        base = os.path.join(self.directory,
+                            datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f") + "-" + label)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(Profiler.TRACEBACK_FRAMES)
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            allocations = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__),
+                 tracemalloc.Filter(False, __file__)))
+            if started_tracing:
+                tracemalloc.stop()
+            profile.dump_stats(base + ".pstats")
+            allocations.dump(base + ".tracemalloc")
+            self._summary(label, elapsed, peak, profile, allocations, base)
+
+    def _summary(self, label, elapsed, peak, profile, allocations, base):
+        print("")
+        print("Profile of {}: {:.3f}s, peak traced memory {:.1f} KiB".format(label, elapsed, peak / 1024))
+        stats = pstats.Stats(profile, stream=sys.stdout)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(self.top)
+        print("Top allocations:")
+        for stat in allocations.statistics("lineno")[:self.top]:
+            print(" ", stat)
+        print("Saved", base + ".pstats", "and", base + ".tracemalloc")
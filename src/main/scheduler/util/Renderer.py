@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import sys
+
+
+class Renderer:
+    # Output format shared by every command; changed with --format or the set_format command
+    FORMATS = ("text", "csv", "json")
+    output_format = "text"
+
+    # Number of rows collected before a streamed result set is written out
+    BATCH_SIZE = 1000
+    MIN_WIDTH = 10
+
+    @staticmethod
+    def set_format(output_format):
+        output_format = output_format.lower()
+        if output_format not in Renderer.FORMATS:
+            raise ValueError("Unknown output format: " + output_format)
+        Renderer.output_format = output_format
+
+    @staticmethod
+    def render(columns, rows, out=None):
+        # Buffered result set: the whole table is built in memory and written with a single call.
+        # Text columns are aligned to the widest value.
+        rows = [tuple(row) for row in rows]
+        widths = [max([len(str(column))] + [len(Renderer._cell(row[i])) for row in rows])
+                  for i, column in enumerate(columns)]
+        buffer = io.StringIO()
+        Renderer._write_header(buffer, columns, widths)
+        for row in rows:
+            Renderer._write_row(buffer, columns, row, widths)
+        (out or sys.stdout).write(buffer.getvalue())
+        return len(rows)
+
+    @staticmethod
+    def stream(columns, rows, out=None):
+        # Streamed result set: rows are consumed lazily (e.g. straight from a cursor) and written in batches, so
+        # memory stays bounded. The header is only written once the first row arrives; returns the row count.
+        out = out or sys.stdout
+        widths = [max(len(str(column)), Renderer.MIN_WIDTH) for column in columns]
+        buffer = io.StringIO()
+        count = 0
+        for row in rows:
+            if count == 0:
+                Renderer._write_header(buffer, columns, widths)
+            Renderer._write_row(buffer, columns, tuple(row), widths)
+            count += 1
+            if count % Renderer.BATCH_SIZE == 0:
+                out.write(buffer.getvalue())
+                buffer = io.StringIO()
+        if buffer.tell() > 0:
+            out.write(buffer.getvalue())
+        return count
+
+    @staticmethod
+    def _cell(value):
+        return "" if value is None else str(value)
+
+    @staticmethod
+    def _write_header(buffer, columns, widths):
+        if Renderer.output_format == "text":
+            line = "\t".join("{: >{}}".format(str(column), width) for column, width in zip(columns, widths))
+            buffer.write("-" * len(line.expandtabs()) + "\n")
+            buffer.write(line + "\n")
+            buffer.write("-" * len(line.expandtabs()) + "\n")
+        elif Renderer.output_format == "csv":
+            csv.writer(buffer, lineterminator="\n").writerow(columns)
+
+    @staticmethod
+    def _write_row(buffer, columns, row, widths):
+        if Renderer.output_format == "text":
+            buffer.write("\t".join("{: >{}}".format(Renderer._cell(value), width)
+                                   for value, width in zip(row, widths)) + "\n")
+        elif Renderer.output_format == "csv":
+            csv.writer(buffer, lineterminator="\n").writerow([Renderer._cell(value) for value in row])
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row)), default=str) + "\n")
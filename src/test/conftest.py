@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scheduler imports its packages (db, model, util, report) relative to src/main/scheduler, as Scheduler.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main", "scheduler"))
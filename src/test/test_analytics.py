@@ -0,0 +1,33 @@
+import datetime
+import pytest
+
+np = pytest.importorskip("numpy")
+from report.Analytics import Analytics  # noqa: E402
+
+TODAY = datetime.date(2026, 3, 10)
+
+
+def days_ago(n):
+    return TODAY - datetime.timedelta(days=n)
+
+
+def test_forecast_uses_the_trailing_rate_and_matches_names_case_insensitively():
+    analytics = Analytics(TODAY).build([("Moderna", 5), ("Pfizer", 10)],
+                                       [(days_ago(1), "pfizer", 2), (days_ago(2), "PFIZER", 2),
+                                        (days_ago(30), "Pfizer", 50)])
+    rows = analytics.stock_out_forecast(trailing_days=4)
+    assert rows[0] == ("Moderna", 5, 0.0, None)
+    assert rows[1] == ("Pfizer", 10, 1.0, TODAY + datetime.timedelta(days=10))
+
+
+def test_empty_stock_runs_out_today():
+    analytics = Analytics(TODAY).build([("Pfizer", 0)], [])
+    assert analytics.stock_out_forecast()[0][3] == TODAY
+
+
+def test_gaps_compare_open_slots_with_expected_demand():
+    analytics = Analytics(TODAY).build([("Pfizer", 100)],
+                                       [(days_ago(1), "Pfizer", 4), (days_ago(2), "Pfizer", 4), (TODAY, "Pfizer", 1)])
+    rows = analytics.gaps(TODAY, np.array([5, 1]), trailing_days=2)
+    # expected demand is 4 a day; today already has 1 booked, so 3 more are expected
+    assert rows == [(TODAY, 1, 5, 4.0, 2.0), (TODAY + datetime.timedelta(days=1), 0, 1, 4.0, -3.0)]
@@ -0,0 +1,61 @@
+import datetime
+from model.AvailabilityInterval import AvailabilityInterval
+
+MONDAY = datetime.date(2026, 1, 5)
+
+
+def days(n):
+    return datetime.timedelta(days=n)
+
+
+def test_daily_occurs_every_day_in_range():
+    interval = AvailabilityInterval("alice", MONDAY, MONDAY + days(6), "daily")
+    assert all(interval.occurs_on(MONDAY + days(i)) for i in range(7))
+    assert not interval.occurs_on(MONDAY - days(1))
+    assert not interval.occurs_on(MONDAY + days(7))
+
+
+def test_weekdays_skip_the_weekend():
+    interval = AvailabilityInterval("alice", MONDAY, MONDAY + days(13), "weekdays")
+    assert [interval.occurs_on(MONDAY + days(i)) for i in range(7)] == [True] * 5 + [False] * 2
+    assert len(list(interval.days())) == 10
+
+
+def test_weekly_repeats_on_the_start_weekday():
+    start = MONDAY + days(2)  # a Wednesday
+    interval = AvailabilityInterval("alice", start, start + days(20), "weekly")
+    assert list(interval.days()) == [start, start + days(7), start + days(14)]
+
+
+def test_expand_orders_by_day_then_interval_and_subtracts_bookings():
+    alice = AvailabilityInterval("alice", MONDAY, MONDAY + days(1), "daily", capacity=2, i_id=1)
+    bob = AvailabilityInterval("bob", MONDAY, MONDAY + days(1), "daily", capacity=1, i_id=2)
+    booked = {(1, MONDAY): 1, (2, MONDAY + days(1)): 1}
+    slots = list(AvailabilityInterval._expand([alice, bob], booked, MONDAY, MONDAY + days(1)))
+    assert slots == [(MONDAY, "alice", 1, 1), (MONDAY, "bob", 2, 1), (MONDAY + days(1), "alice", 1, 2)]
+
+
+def test_expand_clips_to_the_window():
+    interval = AvailabilityInterval("alice", MONDAY, MONDAY + days(30), "daily", i_id=1)
+    slots = list(AvailabilityInterval._expand([interval], {}, MONDAY + days(10), MONDAY + days(12)))
+    assert [slot[0] for slot in slots] == [MONDAY + days(10), MONDAY + days(11), MONDAY + days(12)]
+
+
+def test_expand_without_intervals_is_empty():
+    assert list(AvailabilityInterval._expand([], {}, MONDAY, MONDAY + days(5))) == []
+
+
+def test_first_open_slot_reads_one_chunk_at_a_time(monkeypatch):
+    interval = AvailabilityInterval("alice", MONDAY + days(40), MONDAY + days(400), "daily", i_id=1)
+    windows = []
+
+    def open_slots(conn, start, end):
+        windows.append((start, end))
+        return AvailabilityInterval._expand([interval], {}, start, end)
+
+    monkeypatch.setattr(AvailabilityInterval, "last_end_date", staticmethod(lambda conn: interval.end_date))
+    monkeypatch.setattr(AvailabilityInterval, "open_slots", staticmethod(open_slots))
+    assert AvailabilityInterval.first_open_slot(None, MONDAY, datetime.date.max) == (MONDAY + days(40), "alice", 1, 1)
+    chunk = AvailabilityInterval.SEARCH_CHUNK_DAYS
+    assert windows == [(MONDAY, MONDAY + days(chunk - 1)), (MONDAY + days(chunk), MONDAY + days(2 * chunk - 1))]
+    assert AvailabilityInterval.first_open_slot(None, MONDAY, MONDAY + days(39)) is None
@@ -0,0 +1,21 @@
+from util.BloomFilter import BloomFilter
+
+
+def test_added_values_are_always_found():
+    bloom = BloomFilter(1000)
+    names = ["user{}".format(i) for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+    assert all(bloom.might_contain(name) for name in names)
+
+
+def test_false_positive_rate_stays_near_the_target():
+    bloom = BloomFilter(1000, false_positive_rate=0.01)
+    for i in range(1000):
+        bloom.add("user{}".format(i))
+    false_positives = sum(bloom.might_contain("other{}".format(i)) for i in range(10000))
+    assert false_positives < 300  # 1% expected; generous bound so the test is not flaky
+
+
+def test_empty_filter_contains_nothing():
+    assert not BloomFilter(10).might_contain("anyone")
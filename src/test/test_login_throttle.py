@@ -0,0 +1,75 @@
+import contextlib
+import time
+from unittest import mock
+from db.ConnectionManager import ConnectionManager
+from db import Queries
+from util.LoginThrottle import LoginThrottle, TokenBucket
+
+
+def test_bucket_allows_a_burst_then_reports_the_wait():
+    bucket = TokenBucket(capacity=2, refill_per_second=0.5)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert bucket.take() == 2  # one token takes two seconds to refill
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(capacity=1, refill_per_second=1)
+    bucket.take()
+    bucket.updated -= 5
+    assert bucket.is_full(time.monotonic())
+    assert bucket.take() == 0
+
+
+def test_lockout_grows_exponentially_and_is_capped():
+    free = LoginThrottle.FREE_FAILURES
+    assert LoginThrottle._lockout_for(free - 1) == 0
+    assert LoginThrottle._lockout_for(free) == LoginThrottle.BASE_LOCKOUT_SECONDS
+    assert LoginThrottle._lockout_for(free + 1) == 2 * LoginThrottle.BASE_LOCKOUT_SECONDS
+    assert LoginThrottle._lockout_for(free + 50) == LoginThrottle.MAX_LOCKOUT_SECONDS
+
+
+def test_repeated_failures_lock_the_username_out():
+    throttle = LoginThrottle()
+    for _ in range(LoginThrottle.FREE_FAILURES):
+        assert throttle.check("patient", "pat", "client") == 0
+        throttle.record_failure("patient", "pat", "client")
+    assert throttle.check("patient", "pat", "client") > 0
+    assert throttle.check("patient", "other", "client") == 0
+    throttle.record_success("patient", "pat", "client")
+    assert throttle.check("patient", "pat", "client") == 0
+
+
+def test_sweep_drops_idle_state_but_keeps_active_lockouts():
+    throttle = LoginThrottle()
+    for i in range(LoginThrottle.FREE_FAILURES):
+        throttle.check("patient", "locked", "client")
+        throttle.record_failure("patient", "locked", "client")
+    throttle.check("patient", "idle", "client")
+    throttle.record_failure("patient", "idle", "client")
+    idle_key = LoginThrottle.key("patient", "idle", "client")
+    locked_key = LoginThrottle.key("patient", "locked", "client")
+    throttle.failures[idle_key] = (1, time.monotonic() - LoginThrottle.FAILURE_MEMORY_SECONDS - 1)
+    for bucket in throttle.buckets.values():
+        bucket.updated -= 10 ** 6
+    throttle.last_sweep -= LoginThrottle.SWEEP_SECONDS
+
+    throttle._sweep()
+    assert throttle.buckets == {}
+    assert idle_key not in throttle.failures
+    assert locked_key in throttle.failures and locked_key in throttle.locked_until
+
+
+def test_persisted_sweep_deletes_old_rows(monkeypatch):
+    executed = []
+
+    @contextlib.contextmanager
+    def transaction(conn=None, primary=False):
+        yield mock.Mock()
+
+    monkeypatch.setattr(ConnectionManager, "transaction", staticmethod(transaction))
+    monkeypatch.setattr(Queries, "execute", lambda cursor, query_id, args=(): executed.append((query_id, args)))
+    throttle = LoginThrottle(persist=True)
+    throttle.last_sweep -= LoginThrottle.SWEEP_SECONDS
+    throttle._sweep()
+    assert executed == [("throttle.sweep", (LoginThrottle.SWEEP_BATCH_SIZE, LoginThrottle.FAILURE_MEMORY_SECONDS))]
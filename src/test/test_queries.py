@@ -0,0 +1,23 @@
+import pytest
+from db import Queries
+
+
+def test_parameterized_statements_go_through_sp_executesql():
+    prepared = Queries.get("vaccine.get").prepare()
+    assert prepared.startswith("EXEC sp_executesql N'/* vaccine.get */ SELECT")
+    assert prepared.endswith("N'@name varchar(255)', @name = %s")
+
+
+def test_statements_without_parameters_are_sent_as_is():
+    assert Queries.get("vaccine.all").prepare() == "/* vaccine.all */ SELECT Name, Doses FROM Vaccines ORDER BY Name"
+
+
+def test_bind_checks_the_number_of_arguments():
+    assert Queries.get("vaccine.get").bind("Pfizer") == ("Pfizer",)
+    with pytest.raises(ValueError):
+        Queries.get("vaccine.set_doses").bind((1,))
+
+
+def test_ids_are_unique():
+    with pytest.raises(ValueError):
+        Queries.register("vaccine.get", "SELECT 1")
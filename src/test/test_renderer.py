@@ -0,0 +1,71 @@
+import io
+import json
+import pytest
+from util.Renderer import Renderer
+
+COLUMNS = ("Name", "Doses")
+ROWS = [("Pfizer", 10), ("Moderna", None)]
+
+
+@pytest.fixture(autouse=True)
+def restore_format():
+    yield
+    Renderer.set_format("text")
+
+
+def test_render_text_aligns_columns_to_the_widest_value():
+    out = io.StringIO()
+    assert Renderer.render(COLUMNS, ROWS, out) == 2
+    lines = out.getvalue().splitlines()
+    assert lines[1] == "   Name\tDoses"
+    assert lines[3] == " Pfizer\t   10"
+    assert lines[4] == "Moderna\t     "
+    assert lines[0] == lines[2] == "-" * len(lines[1].expandtabs())
+
+
+def test_render_csv():
+    Renderer.set_format("CSV")
+    out = io.StringIO()
+    Renderer.render(COLUMNS, ROWS, out)
+    assert out.getvalue() == "Name,Doses\nPfizer,10\nModerna,\n"
+
+
+def test_render_json_writes_one_object_per_line():
+    Renderer.set_format("json")
+    out = io.StringIO()
+    Renderer.render(COLUMNS, ROWS, out)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {"Name": "Pfizer", "Doses": 10}, {"Name": "Moderna", "Doses": None}]
+
+
+def test_stream_writes_in_batches_and_counts_rows(monkeypatch):
+    monkeypatch.setattr(Renderer, "BATCH_SIZE", 2)
+    Renderer.set_format("csv")
+    out = io.StringIO()
+    rows = (("user{}".format(i), i) for i in range(5))
+    assert Renderer.stream(COLUMNS, rows, out) == 5
+    assert out.getvalue().splitlines() == ["Name,Doses"] + ["user{},{}".format(i, i) for i in range(5)]
+
+
+def test_stream_text_pads_to_the_minimum_width():
+    out = io.StringIO()
+    Renderer.stream(COLUMNS, iter(ROWS), out)
+    assert out.getvalue().splitlines()[3] == "    Pfizer\t        10"
+
+
+def test_stream_json():
+    Renderer.set_format("json")
+    out = io.StringIO()
+    Renderer.stream(COLUMNS, iter(ROWS), out)
+    assert json.loads(out.getvalue().splitlines()[0]) == {"Name": "Pfizer", "Doses": 10}
+
+
+def test_stream_of_nothing_writes_nothing():
+    out = io.StringIO()
+    assert Renderer.stream(COLUMNS, iter([]), out) == 0
+    assert out.getvalue() == ""
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        Renderer.set_format("xml")
@@ -0,0 +1,65 @@
+import datetime
+import json
+import struct
+import sys
+from array import array
+import pytest
+from db.Snapshot import Snapshot
+
+
+def write_snapshot(path):
+    day = datetime.date(2026, 3, 2)
+    data = {table + "." + name: array("i") for table, names in Snapshot.COLUMNS.items() for name in names}
+    for offset, caregiver in [(0, 0), (0, 1), (1, 1)]:
+        data["availability.day"].append((day + datetime.timedelta(days=offset)).toordinal())
+        data["availability.caregiver"].append(caregiver)
+    data["vaccines.name"].extend([0, 1])
+    data["vaccines.doses"].extend([10, 0])
+    data["appointments.a_id"].append(1)
+    data["appointments.day"].append(day.toordinal())
+    data["appointments.patient"].append(2)
+    data["appointments.caregiver"].append(0)
+    data["appointments.vaccine"].append(0)
+    Snapshot._write(str(path), data, ["alice", "bob", "pat"], ["Moderna", "Pfizer"])
+    return day
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "schedule.snap"
+    day = write_snapshot(path)
+    snapshot = Snapshot(str(path))
+    try:
+        assert snapshot.caregivers_on(day) == ["alice", "bob"]
+        assert snapshot.caregivers_on(day + datetime.timedelta(days=1)) == ["bob"]
+        assert snapshot.caregivers_on(day - datetime.timedelta(days=1)) == []
+        assert list(snapshot.available_dates()) == [(day, "alice"), (day, "bob"),
+                                                    (day + datetime.timedelta(days=1), "bob")]
+        assert snapshot.vaccines() == [("Moderna", 10), ("Pfizer", 0)]
+        assert list(snapshot.column("appointments", "a_id")) == [1]
+    finally:
+        snapshot.close()
+    assert not (tmp_path / "schedule.snap.tmp").exists()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a snapshot at all")
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
+
+
+@pytest.mark.parametrize("cut", [9, 12, 40, -8])
+def test_rejects_truncated_files(tmp_path, cut):
+    path = tmp_path / "schedule.snap"
+    write_snapshot(path)
+    path.write_bytes(path.read_bytes()[:cut])
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
+
+
+def test_rejects_a_header_without_columns(tmp_path):
+    header = json.dumps({"created": "now", "byteorder": sys.byteorder}).encode("utf-8")
+    path = tmp_path / "schedule.snap"
+    path.write_bytes(Snapshot.MAGIC + struct.pack("<I", len(header)) + header)
+    with pytest.raises(ValueError):
+        Snapshot(str(path))